@@ -10,19 +10,61 @@ PracticNupNup - NumLavPro Versión FINAL (Corregida v5)
 - FASE 3.4: Layout A|b, Zoom de Fasor, Botones Dinámicos
 - FASE 3.5: Corregido un typo fatal (value__) en el HTML
 ### FASE 3.7: Corregidos typos (value__, ts='D, 4d), DEFAULT_SIZE=2, y Resultados en Columnas ###
+- FASE 4.0: Modo trifásico por componentes simétricas (método "secuencias")
+- FASE 4.1: Análisis de tolerancias Monte Carlo (/tolerancias)
+- FASE 4.2: Sensibilidades por método adjunto (/sensibilidad)
+- FASE 4.3: Re-solución incremental por sesión (Sherman–Morrison/Woodbury)
+- FASE 4.4: Protocolo de parches por celda entre editor y servidor (/matrix/<sesión>)
+- FASE 4.5: Generadores numéricos (escalera, rejilla, alimentador trifásico) para n grande
+- FASE 4.6: Página principal precompilada y comprimida, Bootstrap local (sin CDN)
+- FASE 4.7: URLs por hash de contenido y caché HTTP para fasores y PDFs
+- FASE 4.8: Modo producción (gunicorn con preload y calentamiento de workers)
+- FASE 4.9: Fasores en un solo quiver con figura plantilla y rótulos depurados
+- FASE 4.10: Superposición multi-armónica con RMS y THD (/armonicos)
+- FASE 4.11: Equivalentes de Thévenin/Norton en varios puertos (/thevenin)
+- FASE 4.12: Almacén persistente en SQLite de soluciones, fasores y PDFs
+- FASE 4.13: Presupuesto de RAM para casos y artefactos con volcado a disco (mmap)
+- FASE 4.14: Diagrama fasorial vectorial en el PDF (ReportLab, sin matplotlib)
+- FASE 4.15: Reporte PDF combinado de varios casos con índice (/reporte/lote)
+- FASE 4.16: Control de admisión por costo estimado (429 + Retry-After)
+- FASE 4.17: Perfilado bajo demanda con cProfile (token, muestreo y /perfil/<id>)
+- FASE 4.18: Conversión vectorizada de componentes a Z/Y en el servidor (/componentes)
+- FASE 4.19: Resolución en vivo por SSE con debounce y descarte de resultados viejos
+- FASE 4.20: Plazos por etapa con cancelación cooperativa y resultados parciales
+- FASE 4.21: Simulación transitoria (Euler implícito/trapecio) con salida CSV en flujo (/transitorio)
+- FASE 4.22: Reducción de Kron de nodos internos con matriz reducida en caché (/kron)
+- FASE 4.23: Detección de subcircuitos independientes y solución por bloques en paralelo
+- FASE 4.24: Respuestas numéricas negociadas por Accept (JSON compacto, .npy, binario)
 """
 
 # 1. Imports
-from flask import Flask, request, jsonify, render_template_string, send_file
+from flask import Flask, request, jsonify, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 import numpy as np
-import cmath, math, io, base64, os, time
+import cmath, math, io, base64, os, time, threading, gzip, hashlib, mimetypes, json
+import sqlite3, mmap, tempfile, shutil, atexit, functools, contextlib, cProfile, pstats, hmac, random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+from reportlab.graphics.shapes import Drawing, Line, Polygon, Circle, String
+from reportlab.lib import colors
+from reportlab.platypus.tableofcontents import TableOfContents
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+try:
+    import brotli # Opcional: variantes .br precomprimidas de los recursos estáticos
+except ImportError:
+    brotli = None
+try:
+    import orjson # Opcional: JSON de las respuestas numéricas sin pasar por listas de Python
+except ImportError:
+    orjson = None
 
 # 2. Configuración de Flask
 app = Flask(__name__)
@@ -31,7 +73,79 @@ app = Flask(__name__)
 MAX_SIZE = 20
 ### FASE 3.7 - MODIFICADO ###
 DEFAULT_SIZE = 2
+MAX_SIZE_NUMERICO = 1000 # Ejemplos numéricos (/example/<tipo>?formato=numerico)
+MAX_COMPONENTES = 200000 # Conversiones componente x frecuencia por petición (/componentes)
+MAX_SENSIBILIDADES = 50000 # Entradas salidas x n² de dx/dA por petición (/sensibilidad)
 PDF_TITLE = "NumLavPro - Reporte de resultados"
+MAX_CASOS_LOTE = 500 # Casos por reporte combinado (/reporte/lote)
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'vendor')
+VENDOR_CACHE_CONTROL = "public, max-age=31536000, immutable" # Rutas versionadas (bootstrap-5.3.2/...)
+MAX_CASOS = 256 # Casos recientes cuyos artefactos pueden generarse bajo demanda
+MAX_ARTEFACTOS = 512 # PNG/PDF ya generados (en RAM o volcados a disco)
+CASOS_RAM_MAX = 16 * 1024 * 1024 # Presupuesto de RAM por worker; lo frío pasa a disco
+ARTEFACTOS_RAM_MAX = 32 * 1024 * 1024
+ESPILL_MIN = 16 * 1024 # Entradas/arreglos menores no se vuelcan a disco
+ARTEFACTOS_TMP = os.environ.get('CIRCUITSOLVE_TMP') or None # Directorio de volcado (None = temporal del sistema)
+ARTEFACTOS_MAX_AGE = 31536000
+# Almacén persistente (SQLite) de soluciones y artefactos; CIRCUITSOLVE_ALMACEN="" lo desactiva
+ALMACEN_RUTA = os.environ.get('CIRCUITSOLVE_ALMACEN', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'circuitsolve_cache.sqlite3'))
+ALMACEN_MAX_BYTES = 256 * 1024 * 1024
+ALMACEN_MAX_FILAS = 20000
+# Control de admisión por worker (unidades: 1 = resolución pequeña interactiva)
+ADMISION_CAPACIDAD = 16
+ADMISION_PESADA_MAX = 12 # Lo que pueden ocupar las peticiones costosas en conjunto
+ADMISION_LIGERA_MAX = 2 # Hasta este costo una petición cuenta como pequeña
+ADMISION_ESPERA_MAX = 2.0 # Segundos en cola antes de responder 429
+ADMISION_COLA_MAX = 32
+ADMISION_FLOPS_UNIDAD = 1e7
+ADMISION_CELDAS_UNIDAD = 1e4 # Celdas de texto parseadas por unidad
+ADMISION_PDF_COSTO = 4 # Por caso, cuando el PDF aún no está generado
+# Perfilado: sin token no se puede pedir por petición; el muestreo es una fracción (0 = apagado)
+PERFIL_TOKEN = os.environ.get('CIRCUITSOLVE_PERFIL_TOKEN') or None
+try:
+    PERFIL_MUESTREO = float(os.environ.get('CIRCUITSOLVE_PERFIL_MUESTREO', 0))
+except ValueError:
+    PERFIL_MUESTREO = 0.0 # Valor mal escrito: sin muestreo en lugar de no arrancar
+PERFIL_MUESTREO = min(max(PERFIL_MUESTREO, 0.0), 1.0) if math.isfinite(PERFIL_MUESTREO) else 0.0
+PERFIL_DIR = os.environ.get('CIRCUITSOLVE_PERFIL_DIR', os.path.join(tempfile.gettempdir(), 'circuitsolve-perfiles'))
+PERFIL_MAX_ARCHIVOS = 50
+# Modo en vivo (SSE): cada flujo abierto ocupa un hilo del worker
+VIVO_DEBOUNCE = 0.12 # Pausa sin ediciones antes de resolver (s)
+VIVO_DEBOUNCE_MAX = 0.5 # Con ediciones continuas se resuelve al menos cada tanto
+VIVO_KEEPALIVE = 15
+VIVO_INACTIVIDAD = 300 # Se cierra el flujo tras este tiempo sin ediciones
+VIVO_REINTENTO_MS = 3000
+# Por worker; el resto usa el modo normal. Cada flujo retiene un hilo, así que debe
+# quedar por debajo de --threads (run_production lo recorta a threads - 1)
+VIVO_MAX_STREAMS = 2
+FASOR_ETIQUETAS_MAX = 12 # Con más fasores se rotulan solo los mayores sin solaparse
+FASOR_SEPARACION = 0.2 # Distancia mínima entre rótulos (fracción del radio)
+FASOR_COLORES = matplotlib.colormaps['tab10'].colors
+MAX_MUESTRAS = 20000 # Monte Carlo: muestras por petición
+MC_MEMORIA_MAX = 64 * 1024 * 1024 # Bytes por bloque de muestras apiladas
+MC_BINS = 30
+MAX_ARMONICOS = 100 # Armónicos por petición (/armonicos)
+ARMONICOS_MEMORIA_MAX = 64 * 1024 * 1024 # Bytes de las matrices apiladas (H x n x n complejos)
+MC_BINS_MAX = 200 # Más clases se recortan a este valor
+MAX_SESIONES = 64 # Sesiones del editor con factorización guardada
+MAX_ACTUALIZACIONES = 32 # Actualizaciones de rango bajo antes de re-factorizar
+COND_WOODBURY_MAX = 1e8
+BLOQUES_MIN_N = 32 # Desde este n se buscan subcircuitos independientes antes de resolver
+BLOQUE_PARALELO_MIN_N = 200 # Bloques de este tamaño o más se resuelven en paralelo
+BLOQUES_HILOS = min(4, os.cpu_count() or 2)
+MAX_REDUCCIONES = 32 # Reducciones de Kron guardadas por worker (/kron/<id>/solve)
+MAX_VECTORES_KRON = 1000 # Vectores de inyección por petición
+RESIDUO_MAX = 1e-9
+# Plazos por etapa (s); lo que se pasa de plazo responde 504 o un resultado parcial
+PLAZOS = {"parseo": 2.0, "solucion": 10.0, "dibujo": 5.0, "pdf": 20.0, "ensamblado": 30.0}
+PLAZO_HILOS = 4 # Pool para trabajo no interrumpible que puede abandonarse
+PLAZO_POOL_MIN_N = 150 # Desde este n la solución corre en el pool
+MC_BLOQUE_MAX = 1024 # Muestras por bloque: acota también el tiempo entre comprobaciones de plazo
+# Transitorio (/transitorio): la salida se genera por bloques mientras se envía
+TRANSITORIO_MAX_PASOS = 10_000_000
+TRANSITORIO_BLOQUE = 4096 # Pasos por bloque (memoria acotada a bloque x n)
+TRANSITORIO_MAX_CAMBIOS = 1000 # Cambios de interruptores (cada estado nuevo se factoriza)
+TRANSITORIO_MAX_FLUJOS = 4 # Simulaciones enviándose a la vez por worker
 
 # 4. Funciones de Utilidad (Parseo de Complejos)
 # ... (Sin cambios) ...
@@ -99,6 +213,139 @@ def rect_to_polar(z):
     ang = math.degrees(cmath.phase(z))
     return mag, ang
 
+def pretty_complex(z, precision=4):
+    mag, ang = rect_to_polar(z)
+    return {"rect": format_rect(z, precision=precision), "mag": mag, "angle": ang}
+
+# 4.1 Conversión de Componentes a Impedancia/Admitancia
+# Versión vectorizada de lo que hace el ayudante del navegador: para m componentes
+# y k frecuencias devuelve Z (k, m) en una sola pasada; Y = 1/Z.
+#   R: Z = R        G (conductancia): Y = G
+#   L: Z = jωL      Γ (invertancia):  Z = jω/Γ
+#   C: Z = 1/(jωC)  D (daraf):        Z = D/(jω)
+TIPOS_COMPONENTE = ('R', 'G', 'L', 'Γ', 'C', 'D')
+PREFIJOS = {'': 1.0, 'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'm': 1e-3, 'k': 1e3, 'M': 1e6}
+
+def parse_component(tipo, valor, prefijo=''):
+    tipo = str(tipo).strip()
+    tipo = 'Γ' if tipo.lower() == 'gamma' else tipo.upper()
+    if tipo not in TIPOS_COMPONENTE:
+        raise ValueError(f"tipo '{tipo}' desconocido (use {', '.join(TIPOS_COMPONENTE)})")
+    if prefijo not in PREFIJOS:
+        raise ValueError(f"prefijo '{prefijo}' desconocido")
+    z = parse_complex(valor)
+    if z.imag != 0 or not math.isfinite(z.real) or z.real < 0:
+        raise ValueError("el valor debe ser real y no negativo")
+    return tipo, z.real * PREFIJOS[prefijo]
+
+def component_impedances(tipos, valores, omegas):
+    tipos = np.asarray(tipos)
+    v = np.asarray(valores, dtype=float)[None, :]
+    jw = 1j * np.asarray(omegas, dtype=float)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.select([tipos == 'R', tipos == 'G', tipos == 'L', tipos == 'Γ', tipos == 'C'],
+                         [v + 0j * jw, 1 / v + 0j * jw, jw * v, jw / v, 1 / (jw * v)],
+                         default=v / jw)
+
+def component_admittances(Z):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 / Z
+
+# 4.2 Plazos por Etapa y Cancelación Cooperativa
+# Cada petición larga recorre etapas (parseo, solución, dibujo, pdf) con su propio
+# límite de tiempo. El plazo activo vive en una variable por hilo y los bucles
+# largos llaman a check_deadline() entre iteraciones. El trabajo que no puede
+# interrumpirse (una llamada a LAPACK grande) se ejecuta en el pool de tareas y
+# se abandona al vencer el plazo: el hilo de la petición queda libre y el trabajo
+# abandonado se detiene en su próximo check_deadline().
+class PlazoVencido(Exception):
+    def __init__(self, etapa):
+        super().__init__(f"Tiempo agotado en la etapa '{etapa}'")
+        self.etapa = etapa
+
+_PLAZO_TLS = threading.local()
+
+class Plazo:
+    def __init__(self, limites=None):
+        self.limites = dict(PLAZOS, **(limites or {}))
+        self.etapa = None
+        self.vence = None
+        self.cancelado = threading.Event()
+
+    @contextlib.contextmanager
+    def en(self, etapa):
+        anterior = getattr(_PLAZO_TLS, 'plazo', None)
+        previa = (self.etapa, self.vence)
+        self.etapa, self.vence = etapa, time.monotonic() + self.limites[etapa]
+        _PLAZO_TLS.plazo = self
+        try:
+            yield self
+        finally:
+            _PLAZO_TLS.plazo = anterior
+            self.etapa, self.vence = previa
+
+    def restante(self):
+        return max(0.0, self.vence - time.monotonic())
+
+    def verificar(self):
+        if self.cancelado.is_set() or time.monotonic() > self.vence:
+            self.cancelado.set()
+            raise PlazoVencido(self.etapa)
+
+    def instantanea(self):
+        # Copia fija de la etapa en curso para otro hilo: sigue valiendo aunque aquí la
+        # etapa ya haya terminado, y comparte la cancelación con el original
+        copia = Plazo(self.limites)
+        copia.etapa, copia.vence, copia.cancelado = self.etapa, self.vence, self.cancelado
+        return copia
+
+def current_deadline():
+    return getattr(_PLAZO_TLS, 'plazo', None)
+
+def check_deadline():
+    plazo = current_deadline()
+    if plazo is not None:
+        plazo.verificar()
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def process_pool(nombre, hilos):
+    # Se crea en cada proceso al primer uso (los hilos no sobreviven al fork de gunicorn)
+    with _POOLS_LOCK:
+        pid, pool = _POOLS.get(nombre, (None, None))
+        if pid != os.getpid():
+            pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix=f'circuitsolve-{nombre}')
+            _POOLS[nombre] = (os.getpid(), pool)
+        return pool
+
+def tareas_pool():
+    return process_pool('tarea', PLAZO_HILOS)
+
+def run_with_deadline(fn, *args, **kwargs):
+    plazo = current_deadline()
+    if plazo is None:
+        return fn(*args, **kwargs)
+    # El hilo del pool no toca el plazo del pedido: cuando la etapa termina aquí su vencimiento
+    # vuelve a None, y el trabajo puede seguir corriendo hasta ver la cancelación
+    copia = plazo.instantanea()
+    restante = copia.restante()
+
+    def tarea():
+        _PLAZO_TLS.plazo = copia # Los check_deadline() del trabajo ven la misma etapa
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _PLAZO_TLS.plazo = None
+
+    futuro = tareas_pool().submit(tarea)
+    try:
+        return futuro.result(timeout=restante)
+    except FutureTimeout:
+        futuro.cancel()
+        copia.cancelado.set()
+        raise PlazoVencido(copia.etapa)
+
 # 5. Ejemplos de Circuitos
 # ... (Sin cambios) ...
 def example_rlc_series(n=3):
@@ -134,24 +381,161 @@ def example_trifasico():
     b = ["120∠0", "120∠-120", "120∠120"]
     return A, b, "Ejemplo trifásico"
 
+# 5.1 Generadores Numéricos
+# Construyen A y b directamente como arreglos complejos (sin pasar por texto ni
+# por parse_complex), pensados para pruebas de carga y estudios con n grande.
+# Todos arman la matriz en formato COO (filas, cols, valores); con sparse=True
+# se devuelve esa tupla (filas, cols, valores, (n, n)) en lugar de la densa.
+def _coo_salida(filas, cols, vals, n, sparse):
+    filas = np.asarray(filas, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    vals = np.asarray(vals, dtype=complex)
+    if sparse:
+        return filas, cols, vals, (n, n)
+    A = np.zeros((n, n), dtype=complex)
+    np.add.at(A, (filas, cols), vals)
+    return A
+
+def _tridiagonal(diag, sup, inf, n, sparse):
+    k = np.arange(n)
+    filas = np.concatenate([k, k[:-1], k[1:]])
+    cols = np.concatenate([k, k[1:], k[:-1]])
+    vals = np.concatenate([np.broadcast_to(diag, (n,)), np.broadcast_to(sup, (n-1,)), np.broadcast_to(inf, (n-1,))])
+    return _coo_salida(filas, cols, vals, n, sparse)
+
+def gen_rlc_series(n=3, sparse=False):
+    i = np.arange(n)
+    R = 5 + i*1.0
+    XL = 2 + 0.5*i
+    XC = 1/(2*math.pi*60*(1+0.1*i))
+    A = _tridiagonal(R + 1j*(XL - XC), -1.0, 1.0, n, sparse)
+    b = np.zeros(n, dtype=complex)
+    b[0] = 120
+    return A, b, "Ejemplo RLC serie"
+
+def gen_ac(n=3, sparse=False):
+    i = np.arange(n)
+    A = _tridiagonal((10 + i) + 0.5j*i, -1.5+0.2j, 0.7-0.3j, n, sparse)
+    b = np.zeros(n, dtype=complex)
+    b[0] = 230
+    return A, b, "Ejemplo AC"
+
+def gen_trifasico(n=3, sparse=False):
+    # n/3 cargas trifásicas balanceadas e independientes (una fuente por fase)
+    barras = _barras_trifasicas(n)
+    A = _coo_salida(np.arange(n), np.arange(n), np.full(n, 10+5j), n, sparse)
+    b = np.tile(120 * np.exp(1j*np.radians([0, -120, 120])), barras)
+    return A, b, "Ejemplo trifásico"
+
+def _barras_trifasicas(n):
+    if n < 3 or n % 3:
+        raise ValueError("n debe ser múltiplo de 3 (una incógnita por fase)")
+    return n // 3
+
+def gen_ladder(n=3, Zs=1+0.5j, Zp=10-2j, V=120, sparse=False):
+    # Escalera en mallas: cada malla tiene Zs en serie y comparte Zp con la siguiente
+    n = max(n, 1)
+    diag = np.full(n, Zs + 2*Zp, dtype=complex)
+    diag[0] = Zs + Zp
+    A = _tridiagonal(diag, -Zp, -Zp, n, sparse)
+    b = np.zeros(n, dtype=complex)
+    b[0] = V
+    return A, b, "Escalera (mallas)"
+
+def gen_grid(filas=3, cols=3, Yb=1-0.5j, Yg=0.05+0.01j, I=1, sparse=False, n=None):
+    # Rejilla de nodos con admitancia Yb entre vecinos y Yg a tierra; inyección en el nodo 1.
+    # Con n < filas*cols la última fila queda incompleta (nodos numerados por filas).
+    n = filas * cols if n is None else n
+    k = np.arange(n)
+    derecha = k[(k % cols < cols - 1) & (k + 1 < n)]
+    abajo = k[k + cols < n]
+    p = np.concatenate([derecha, abajo])
+    q = np.concatenate([derecha + 1, abajo + cols])
+    A = _coo_salida(np.concatenate([p, q, p, q, k]), np.concatenate([p, q, q, p, k]),
+                    np.concatenate([np.full(2*len(p), Yb), np.full(2*len(p), -Yb), np.full(n, Yg)]),
+                    n, sparse)
+    b = np.zeros(n, dtype=complex)
+    b[0] = I
+    return A, b, "Rejilla (nodos)"
+
+def gen_feeder_trifasico(barras=3, Zs=0.4+0.8j, Zm=0.1+0.3j, Zcarga=20+8j, Zfuente=0.05+0.5j, V=120, sparse=False):
+    # Alimentador radial en nodos: tramos con bloques 3x3 (Zs propia, Zm mutua),
+    # carga en estrella en cada barra y fuente balanceada (equivalente de Norton) en la barra 1.
+    # Incógnitas ordenadas por barra (3*k + fase), igual que el modo "secuencias".
+    barras = max(barras, 1)
+    n = 3 * barras
+    Zl = np.full((3, 3), Zm, dtype=complex)
+    np.fill_diagonal(Zl, Zs)
+    Yl = np.linalg.inv(Zl)
+    # Tramo entre barras k y k+1: +Yl en los bloques propios, -Yl en los mutuos
+    k = np.arange(barras - 1)
+    ff, cc = np.meshgrid(np.arange(3), np.arange(3), indexing='ij')
+    filas, cols, vals = [], [], []
+    for bp, bq, signo in ((k, k, 1), (k+1, k+1, 1), (k, k+1, -1), (k+1, k, -1)):
+        filas.append((3*bp[:, None, None] + ff).ravel())
+        cols.append((3*bq[:, None, None] + cc).ravel())
+        vals.append(np.broadcast_to(signo * Yl, (len(k), 3, 3)).ravel())
+    diag = np.arange(n)
+    Ydiag = np.full(n, 1/Zcarga, dtype=complex)
+    Ydiag[:3] += 1/Zfuente
+    filas = np.concatenate(filas + [diag])
+    cols = np.concatenate(cols + [diag])
+    vals = np.concatenate(vals + [Ydiag])
+    A = _coo_salida(filas, cols, vals, n, sparse)
+    b = np.zeros(n, dtype=complex)
+    b[:3] = V * np.exp(1j*np.radians([0, -120, 120])) / Zfuente
+    return A, b, "Alimentador trifásico (nodos)"
+
+def gen_grid_n(n=9, sparse=False):
+    lado = max(1, math.isqrt(n))
+    return gen_grid(-(-n // lado), lado, sparse=sparse, n=n)
+
+def gen_feeder_n(n=3, sparse=False):
+    return gen_feeder_trifasico(_barras_trifasicas(n), sparse=sparse)
+
+GENERADORES = {
+    'rlc': gen_rlc_series,
+    'ac': gen_ac,
+    'trif': gen_trifasico,
+    'escalera': gen_ladder,
+    'rejilla': gen_grid_n,
+    'alimentador': gen_feeder_n,
+}
+
+def format_cell(z):
+    z = complex(z)
+    if z == 0: return "0"
+    return f"{z.real:.6f}{z.imag:+.6f}j"
+
 # 6. Lógica del Solucionador
 # ... (Sin cambios) ...
-def validate_and_build_A_b(A_strings, b_strings):
+def validate_shape(A_strings, b_strings):
     if not isinstance(A_strings, list) or not A_strings:
         raise ValueError("Matriz A vacía")
     n = len(A_strings)
     for row in A_strings:
         if len(row) != n: raise ValueError("A debe ser cuadrada (n x n)")
-    if len(b_strings) != n: raise ValueError("Vector b debe tener tamaño n")
+    if not isinstance(b_strings, list) or len(b_strings) != n: raise ValueError("Vector b debe tener tamaño n")
+    return n
+
+def parse_A_cell(A_strings, i, j):
+    try: return parse_complex(A_strings[i][j])
+    except Exception as e: raise ValueError(f"Error en A[{i+1},{j+1}]: {e}")
+
+def parse_b_cell(b_strings, i):
+    try: return parse_complex(b_strings[i])
+    except Exception as e: raise ValueError(f"Error en b[{i+1}]: {e}")
+
+def validate_and_build_A_b(A_strings, b_strings):
+    n = validate_shape(A_strings, b_strings)
     A = np.zeros((n,n), dtype=complex)
     b = np.zeros(n, dtype=complex)
     for i in range(n):
+        check_deadline()
         for j in range(n):
-            try: A[i,j] = parse_complex(A_strings[i][j])
-            except Exception as e: raise ValueError(f"Error en A[{i+1},{j+1}]: {e}")
+            A[i,j] = parse_A_cell(A_strings, i, j)
     for i in range(n):
-        try: b[i] = parse_complex(b_strings[i])
-        except Exception as e: raise ValueError(f"Error en b[{i+1}]: {e}")
+        b[i] = parse_b_cell(b_strings, i)
     if abs(np.linalg.det(A)) < 1e-14:
         raise ValueError("Determinante cero (matriz singular)")
     return A, b
@@ -166,61 +550,837 @@ def solve_system(A, b, method='auto'):
         if abs(detA) < 1e-14: raise np.linalg.LinAlgError("Determinante cero")
         x = np.zeros(n, dtype=complex)
         for i in range(n):
+            check_deadline()
             Ai = A.copy()
             Ai[:,i] = b
             x[i] = np.linalg.det(Ai) / detA
         return x
     elif method == 'gauss':
+        if n >= BLOQUES_MIN_N:
+            x = solve_por_bloques(A, b) # Subcircuitos independientes (6.10)
+            if x is not None:
+                return x
         return np.linalg.solve(A,b)
+    elif method == 'secuencias':
+        return solve_secuencias(A, b)[0]
     else:
         raise ValueError("Método desconocido")
 
+# 6.1 Componentes Simétricas (Fortescue)
+# Las incógnitas se ordenan por barra: índice 3*k + fase (a, b, c), de modo que
+# A está formada por bloques 3x3 (propios y mutuos) entre barras.
+FORTESCUE_A = cmath.rect(1.0, 2*math.pi/3)
+# fase = T @ secuencia, con secuencia = (cero, positiva, negativa)
+FORTESCUE_T = np.array([[1, 1, 1],
+                        [1, FORTESCUE_A**2, FORTESCUE_A],
+                        [1, FORTESCUE_A, FORTESCUE_A**2]], dtype=complex)
+FORTESCUE_T_INV = np.array([[1, 1, 1],
+                            [1, FORTESCUE_A, FORTESCUE_A**2],
+                            [1, FORTESCUE_A**2, FORTESCUE_A]], dtype=complex) / 3
+SECUENCIAS = ("cero", "positiva", "negativa")
+TOL_SECUENCIAS = 1e-9
+
+def phase_to_sequence(X):
+    # X con forma (..., 3): se transforma todo el lote de una vez
+    return np.einsum('sp,...p->...s', FORTESCUE_T_INV, np.asarray(X, dtype=complex))
+
+def sequence_to_phase(X):
+    return np.einsum('ps,...s->...p', FORTESCUE_T, np.asarray(X, dtype=complex))
+
+def sequence_matrix(A):
+    A = np.asarray(A, dtype=complex)
+    if A.ndim != 2 or A.shape[0] != A.shape[1] or A.shape[0] % 3:
+        raise ValueError("El modo trifásico requiere una matriz 3k x 3k")
+    nb = A.shape[0] // 3
+    A4 = A.reshape(nb, 3, nb, 3)
+    return np.einsum('sp,kplq,qr->kslr', FORTESCUE_T_INV, A4, FORTESCUE_T)
+
+def solve_secuencias(A, b):
+    A = np.array(A, dtype=complex)
+    b = np.array(b, dtype=complex)
+    As = sequence_matrix(A)
+    nb = As.shape[0]
+    if b.shape[0] != 3*nb:
+        raise ValueError("Vector b debe tener tamaño n")
+    # b puede ser un vector (3n,) o un lote de casos (3n, m)
+    B = b.reshape(nb, 3, -1)
+    Bs = np.einsum('sp,kpm->ksm', FORTESCUE_T_INV, B)
+
+    escala = max(np.max(np.abs(As)), 1e-300)
+    acople = np.abs(As).copy()
+    for s in range(3):
+        acople[:, s, :, s] = 0
+    if np.max(acople) > TOL_SECUENCIAS * escala:
+        # Bloques no circulantes: las redes de secuencia están acopladas
+        return np.linalg.solve(A, b), {"estrategia": "acoplada", "x_sec": None}
+
+    escala_b = max(np.max(np.abs(Bs)), 1e-300)
+    balanceado = (np.max(np.abs(Bs[:, 0, :])) <= TOL_SECUENCIAS * escala_b and
+                  np.max(np.abs(Bs[:, 2, :])) <= TOL_SECUENCIAS * escala_b)
+    Xs = np.zeros_like(Bs)
+    # Sistema balanceado: basta el equivalente monofásico (secuencia positiva)
+    activas = (1,) if balanceado else (0, 1, 2)
+    for s in activas:
+        Xs[:, s, :] = np.linalg.solve(As[:, s, :, s], Bs[:, s, :])
+    X = np.einsum('ps,ksm->kpm', FORTESCUE_T, Xs).reshape(b.shape)
+    estrategia = "equivalente_monofasico" if balanceado else "secuencias"
+    return X, {"estrategia": estrategia, "x_sec": Xs.reshape((nb, 3) + b.shape[1:])}
+
+# 6.2 Análisis de Tolerancias (Monte Carlo)
+# Las tolerancias son relativas (0.05 = ±5 %). En 'uniforme' la muestra cae en
+# [-tol, +tol]; en 'normal' la tolerancia corresponde a 3 sigmas.
+def _mc_draw(rng, distribucion, shape, tol):
+    if distribucion == 'uniforme':
+        return rng.uniform(-1.0, 1.0, shape) * tol
+    elif distribucion == 'normal':
+        return rng.standard_normal(shape) * (tol / 3.0)
+    raise ValueError("Distribución desconocida (use 'uniforme' o 'normal')")
+
+def monte_carlo_tolerancias(A, b, tol_A=0.0, tol_b=0.0, componentes=None, muestras=1000,
+                            distribucion='uniforme', semilla=None, bins=MC_BINS, memoria_max=MC_MEMORIA_MAX):
+    A = np.array(A, dtype=complex)
+    b = np.array(b, dtype=complex)
+    n = A.shape[0]
+    if muestras < 1 or muestras > MAX_MUESTRAS:
+        raise ValueError(f"Número de muestras inválido (1..{MAX_MUESTRAS})")
+    if bins < 1:
+        raise ValueError("El número de clases del histograma debe ser positivo")
+    bins = min(bins, MC_BINS_MAX)
+    tol_A = np.broadcast_to(np.asarray(tol_A, dtype=float), (n, n))
+    tol_b = np.broadcast_to(np.asarray(tol_b, dtype=float), (n,))
+    if np.any(tol_A < 0) or np.any(tol_b < 0):
+        raise ValueError("Las tolerancias deben ser no negativas")
+    rng = np.random.default_rng(semilla)
+
+    # Componentes: un mismo elemento aparece en varias celdas (±Z); su desviación
+    # se sortea una sola vez por muestra y se estampa en todas ellas.
+    componentes = componentes or []
+    filas, cols, idx, coefs = [], [], [], []
+    valores = np.zeros(len(componentes), dtype=complex)
+    tols = np.zeros(len(componentes))
+    for c, comp in enumerate(componentes):
+        valores[c] = comp["valor"]
+        tols[c] = comp["tol"]
+        for (i, j, coef) in comp["celdas"]:
+            filas.append(i); cols.append(j); idx.append(c); coefs.append(coef)
+    filas, cols, idx = np.array(filas, dtype=int), np.array(cols, dtype=int), np.array(idx, dtype=int)
+    coefs = np.array(coefs, dtype=float)
+
+    # Bloques de muestras acotados en memoria (A apilada domina: m*n*n complejos)
+    por_muestra = 16 * (n*n + n) * 3
+    bloque = int(max(1, min(muestras, MC_BLOQUE_MAX, memoria_max // por_muestra)))
+    X = np.empty((muestras, n), dtype=complex)
+    usa_tol_A = bool(np.any(tol_A > 0))
+    usa_tol_b = bool(np.any(tol_b > 0))
+    parcial = False
+    for inicio in range(0, muestras, bloque):
+        try:
+            check_deadline()
+        except PlazoVencido:
+            if inicio == 0:
+                raise
+            # Resultado parcial: estadísticas con las muestras ya calculadas
+            X, muestras, parcial = X[:inicio], inicio, True
+            break
+        m = min(bloque, muestras - inicio)
+        if usa_tol_A:
+            As = A * (1.0 + _mc_draw(rng, distribucion, (m, n, n), tol_A))
+        else:
+            As = np.repeat(A[None, :, :], m, axis=0)
+        if len(componentes):
+            delta = _mc_draw(rng, distribucion, (m, len(componentes)), tols) * valores
+            np.add.at(As, (slice(None), filas, cols), delta[:, idx] * coefs)
+        if usa_tol_b:
+            bs = b * (1.0 + _mc_draw(rng, distribucion, (m, n), tol_b))
+        else:
+            bs = np.repeat(b[None, :], m, axis=0)
+        try:
+            X[inicio:inicio+m] = np.linalg.solve(As, bs[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            raise ValueError("Una muestra produjo una matriz singular")
+
+    x_nom = np.linalg.solve(A, b)
+    mags = np.abs(X)
+    # Ángulo medido respecto al nominal para evitar el salto de ±180°
+    desv = np.degrees(np.angle(X * np.conj(x_nom)))
+    ang_nom = np.degrees(np.angle(x_nom))
+    estadisticas = []
+    for k in range(n):
+        conteos, bordes = np.histogram(mags[:, k], bins=bins)
+        p5, p50, p95 = np.percentile(mags[:, k], [5, 50, 95])
+        estadisticas.append({
+            "media": X[:, k].mean(),
+            "mag": {"media": float(mags[:, k].mean()), "std": float(mags[:, k].std()),
+                    "min": float(mags[:, k].min()), "max": float(mags[:, k].max()),
+                    "p5": float(p5), "p50": float(p50), "p95": float(p95)},
+            "angulo": {"media": float(ang_nom[k] + desv[:, k].mean()), "std": float(desv[:, k].std()),
+                       "min": float(ang_nom[k] + desv[:, k].min()), "max": float(ang_nom[k] + desv[:, k].max())},
+            "histograma": {"conteos": conteos.tolist(), "bordes": bordes.tolist()},
+        })
+    return {"nominal": x_nom, "muestras": muestras, "estadisticas": estadisticas, "parcial": parcial}
+
+# 6.3 Factorización Reutilizable
+# numpy no expone getrf/getrs por separado, así que se guarda A⁻¹ (obtenida con
+# la LU de LAPACK una sola vez); cada resolución posterior, directa o adjunta,
+# es un producto matriz-vector O(n²).
+class Factorizacion:
+    def __init__(self, A):
+        self.A = np.array(A, dtype=complex)
+        self.n = self.A.shape[0]
+        self.inv = np.linalg.inv(self.A)
+        self.actualizaciones = 0
+
+    def solve(self, B):
+        return self.inv @ B
+
+    def solve_transpose(self, C):
+        return self.inv.T @ C
+
+# 6.4 Sensibilidades (Método Adjunto)
+# Para cada salida k: A^T λ_k = e_k  =>  ∂x_k/∂b_i = λ_k[i],  ∂x_k/∂A_ij = -λ_k[i]·x_j
+def sensibilidades(A, b, salidas=None, factor=None):
+    F = factor if factor is not None else Factorizacion(A)
+    b = np.array(b, dtype=complex)
+    x = F.solve(b)
+    salidas = np.arange(F.n) if salidas is None else np.asarray(salidas, dtype=int)
+    # Una sola resolución adjunta con todas las salidas como lado derecho
+    lam = F.solve_transpose(np.eye(F.n, dtype=complex)[:, salidas]).T  # (k, n)
+    dx_db = lam
+    dx_dA = -lam[:, :, None] * x[None, None, :]  # (k, n, n)
+    return x, dx_db, dx_dA
+
+def ranking_sensibilidades(A, b, x, dx_db, dx_dA, salidas, top=5, orden='relativa'):
+    if orden not in ('relativa', 'absoluta'):
+        raise ValueError("Orden de ranking desconocido (use 'relativa' o 'absoluta')")
+    A = np.asarray(A, dtype=complex)
+    b = np.asarray(b, dtype=complex)
+    n = A.shape[0]
+    rankings = []
+    for fila, k in enumerate(salidas):
+        escala = max(abs(x[k]), 1e-300)
+        sens = np.concatenate([dx_dA[fila].ravel(), dx_db[fila]])
+        # Sensibilidad normalizada: variación relativa de x_k por variación relativa del parámetro
+        rel = np.abs(sens * np.concatenate([A.ravel(), b])) / escala
+        clave = rel if orden == 'relativa' else np.abs(sens)
+        mejores = np.argsort(-clave, kind='stable')[:top]
+        items = []
+        for p in mejores:
+            if p < n*n:
+                item = {"tipo": "A", "celda": [int(p // n) + 1, int(p % n) + 1]}
+            else:
+                item = {"tipo": "b", "celda": [int(p - n*n) + 1]}
+            item["sens"] = sens[p]
+            item["relativa"] = float(rel[p])
+            items.append(item)
+        rankings.append(items)
+    return rankings
+
+# 6.5 Sesiones y Actualizaciones de Rango Bajo
+# Cada sesión del editor conserva la última matriz (texto y numérica) y su
+# factorización. Si solo cambian unas pocas celdas se aplica Sherman–Morrison/
+# Woodbury sobre A⁻¹ en O(n²·k); si la actualización es numéricamente dudosa se
+# vuelve a factorizar desde cero.
+class Sesion:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.A_strings = None
+        self.b_strings = None
+        self.A = None
+        self.b = None
+        self.factor = None
+        self.canal = None # Modo en vivo (10.5), se crea al abrir el flujo
+
+SESIONES = OrderedDict()
+SESIONES_LOCK = threading.Lock()
+
+def get_sesion(sid):
+    if not isinstance(sid, str) or not sid or len(sid) > 64:
+        raise ValueError("Identificador de sesión inválido")
+    with SESIONES_LOCK:
+        sesion = SESIONES.get(sid)
+        if sesion is None:
+            sesion = SESIONES[sid] = Sesion()
+        SESIONES.move_to_end(sid)
+        while len(SESIONES) > MAX_SESIONES:
+            SESIONES.popitem(last=False)
+        return sesion
+
+def woodbury_update(factor, filas, cols, valores):
+    # A' = A + U V^T con U = [d_k e_i], V = [e_j]  (una columna por celda modificada)
+    filas = np.asarray(filas, dtype=int)
+    cols = np.asarray(cols, dtype=int)
+    valores = np.asarray(valores, dtype=complex)
+    deltas = valores - factor.A[filas, cols]
+    inv = factor.inv
+    cap = np.eye(len(deltas), dtype=complex) + inv[np.ix_(cols, filas)] * deltas
+    if np.linalg.cond(cap) > COND_WOODBURY_MAX:
+        raise np.linalg.LinAlgError("Actualización de rango bajo mal condicionada")
+    factor.inv = inv - (inv[:, filas] * deltas) @ np.linalg.solve(cap, inv[cols, :])
+    factor.A[filas, cols] = valores
+    factor.actualizaciones += 1
+
+def _refactorizar(A):
+    if abs(np.linalg.det(A)) < 1e-14:
+        raise ValueError("Determinante cero (matriz singular)")
+    return Factorizacion(A)
+
+def usa_factorizacion(method, n):
+    return method == 'gauss' or (method == 'auto' and n > 4)
+
+def _editar(sesion, celdas, fuentes):
+    # Aplica ediciones sueltas sobre copias de la matriz guardada y re-parsea solo esas celdas
+    n = len(sesion.A_strings)
+    A_strings = [list(row) for row in sesion.A_strings]
+    b_strings = list(sesion.b_strings)
+    A = sesion.A.copy()
+    b = sesion.b.copy()
+    for i, j, valor in celdas:
+        if not (0 <= i < n and 0 <= j < n): raise ValueError(f"Celda A[{i+1},{j+1}] fuera de rango")
+        A_strings[i][j] = valor
+        A[i, j] = parse_A_cell(A_strings, i, j)
+    for i, valor in fuentes:
+        if not (0 <= i < n): raise ValueError(f"Celda b[{i+1}] fuera de rango")
+        b_strings[i] = valor
+        b[i] = parse_b_cell(b_strings, i)
+    return A_strings, b_strings, A, b
+
+def _resolver_factorizado(factor, A, b, nueva=False):
+    if nueva or factor is None or factor.n != A.shape[0]:
+        factor = factor if nueva else _refactorizar(A)
+        estrategia = "completa"
+    else:
+        filas, cols = np.nonzero(A != factor.A)
+        estrategia = "reutilizada"
+        if len(filas):
+            if len(filas) > max(1, factor.n // 4) or factor.actualizaciones >= MAX_ACTUALIZACIONES:
+                factor = _refactorizar(A)
+                estrategia = "completa"
+            else:
+                try:
+                    woodbury_update(factor, filas, cols, A[filas, cols])
+                    estrategia = "woodbury"
+                except np.linalg.LinAlgError:
+                    factor = _refactorizar(A)
+                    estrategia = "completa"
+    x = factor.solve(b)
+    if estrategia != "completa":
+        # El error acumulado de las actualizaciones se vigila con el residuo
+        residuo = np.linalg.norm(A @ x - b) / (np.linalg.norm(A) * np.linalg.norm(x) + np.linalg.norm(b) + 1e-300)
+        if residuo > RESIDUO_MAX:
+            factor = _refactorizar(A)
+            x = factor.solve(b)
+            estrategia = "completa"
+    return factor, x, estrategia
+
+def solve_en_sesion(sesion, method, A_strings=None, b_strings=None, celdas=(), fuentes=(), mode='mallas'):
+    # Con A_strings/b_strings se compara contra la matriz guardada; con celdas/fuentes
+    # (protocolo PATCH) se aplican directamente las ediciones recibidas. Un caso ya
+    # resuelto se toma del almacén (10.2) sin tocar la factorización: el próximo
+    # parche la compara contra la A nueva como siempre.
+    try:
+        factor = sesion.factor
+        nueva = False
+        if A_strings is not None:
+            n = validate_shape(A_strings, b_strings)
+            if sesion.A_strings is None or len(sesion.A_strings) != n:
+                A, b = validate_and_build_A_b(A_strings, b_strings)
+                A_strings = [list(row) for row in A_strings]
+                b_strings = list(b_strings)
+                nueva = usa_factorizacion(method, n)
+                factor = None
+            else:
+                viejo_A, viejo_b = sesion.A_strings, sesion.b_strings
+                celdas = [(i, j, A_strings[i][j]) for i in range(n) for j in range(n)
+                          if A_strings[i][j] != viejo_A[i][j]]
+                fuentes = [(i, b_strings[i]) for i in range(n) if b_strings[i] != viejo_b[i]]
+                A_strings, b_strings, A, b = _editar(sesion, celdas, fuentes)
+        else:
+            if sesion.A_strings is None:
+                raise LookupError("La sesión no tiene matriz; envíe la matriz completa")
+            A_strings, b_strings, A, b = _editar(sesion, celdas, fuentes)
+        n = A.shape[0]
+        seq_info = None
+        clave = result_key(A, b, method, mode)
+        guardado = stored_result(clave)
+        if guardado is not None:
+            (x, seq_info), estrategia = guardado, "almacen"
+        elif usa_factorizacion(method, n):
+            factor, x, estrategia = _resolver_factorizado(Factorizacion(A) if nueva else factor, A, b, nueva)
+        else:
+            if abs(np.linalg.det(A)) < 1e-14:
+                raise ValueError("Determinante cero (matriz singular)")
+            factor, estrategia = None, "directa"
+            if method == 'secuencias':
+                x, seq_info = solve_secuencias(A, b)
+            else:
+                x = solve_system(A, b, method=method)
+        if guardado is None:
+            store_result(clave, A, b, x, seq_info)
+        sesion.A_strings, sesion.b_strings = A_strings, b_strings
+        sesion.A, sesion.b, sesion.factor = A, b, factor
+        return A_strings, b_strings, A, b, x, estrategia, seq_info
+    except Exception:
+        # La factorización pudo quedar a medio actualizar: se descarta
+        sesion.factor = None
+        raise
+
+# 6.6 Análisis Armónico (Superposición)
+# El circuito se describe con componentes de 4.1 (R, G, L, Γ, C, D) entre dos
+# mallas o dos nodos (índices desde 1; 0 = exterior/referencia). En mallas se
+# estampan impedancias, en nodos admitancias, y se arman las matrices de todos
+# los armónicos a la vez.
+# Los fasores de las fuentes se interpretan como valores eficaces.
+def element_stamps(pares):
+    # Índices y signos de la estampa de dos terminales: +w en (p,p),(q,q); -w en (p,q),(q,p)
+    filas, cols, idx, signos = [], [], [], []
+    for e, (p, q) in enumerate(pares):
+        for (i, j, s) in ((p, p, 1), (q, q, 1), (p, q, -1), (q, p, -1)):
+            if i > 0 and j > 0:
+                filas.append(i-1); cols.append(j-1); idx.append(e); signos.append(s)
+    return (np.array(filas, dtype=int), np.array(cols, dtype=int),
+            np.array(idx, dtype=int), np.array(signos, dtype=float))
+
+def build_harmonic_matrices(tipos, valores, pares, omegas, n, mode='mallas'):
+    Z = component_impedances(tipos, valores, omegas)
+    W = Z if mode == 'mallas' else component_admittances(Z)
+    filas, cols, idx, signos = element_stamps(pares)
+    A = np.zeros((len(omegas), n, n), dtype=complex)
+    np.add.at(A, (slice(None), filas, cols), W[:, idx] * signos)
+    return A
+
+def solve_armonicos(tipos, valores, pares, armonicos, B, f0=60.0, mode='mallas'):
+    armonicos = np.asarray(armonicos, dtype=float)
+    B = np.asarray(B, dtype=complex)
+    A = build_harmonic_matrices(tipos, valores, pares, 2*math.pi*f0*armonicos, B.shape[1], mode)
+    try:
+        X = np.linalg.solve(A, B[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        raise ValueError("Matriz singular en alguno de los armónicos")
+    rms = np.sqrt(np.sum(np.abs(X)**2, axis=0))
+    fund = np.flatnonzero(armonicos == 1)
+    thd = None
+    if fund.size:
+        x1 = np.abs(X[fund[0]])
+        resto = np.sqrt(np.maximum(rms**2 - x1**2, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            thd = np.where(x1 > 0, resto / x1, np.nan)
+    return X, rms, thd
+
+# 6.7 Equivalentes de Thévenin/Norton en Múltiples Puertos
+# Con e = e_p - e_q (índices desde 1, 0 = referencia), una sola factorización da:
+#   nodos:  V_th = x_p - x_q,  Z_th = eᵀ A⁻¹ e      (tensión y impedancia entre nodos)
+#   mallas: I_N  = x_p - x_q,  Y_N  = eᵀ A⁻¹ e      (corriente de la rama común y
+#           admitancia vista desde un corte en serie con ella)
+# No hace falta A⁻¹: una sola LU resuelve [b | e_1 ... e_k] y de esas k+1 columnas
+# salen x y A⁻¹e de cada puerto.
+def equivalentes_thevenin(A, b, puertos, mode='nodos', factor=None):
+    A = np.asarray(A, dtype=complex)
+    n = A.shape[0]
+    puertos = np.asarray(puertos, dtype=int).reshape(-1, 2)
+    # Vectores incidencia de los puertos (una columna por puerto)
+    E = np.zeros((n, len(puertos)))
+    pos = np.flatnonzero(puertos.ravel() > 0)
+    E[puertos.ravel()[pos] - 1, pos // 2] = np.where(pos % 2 == 0, 1.0, -1.0)
+    rhs = np.column_stack([np.asarray(b, dtype=complex), E])
+    sol = factor.solve(rhs) if factor is not None else np.linalg.solve(A, rhs)
+    x, W = sol[:, 0], sol[:, 1:]
+    x_ext = np.concatenate([[0], x])
+    diferencia = x_ext[puertos[:, 0]] - x_ext[puertos[:, 1]]
+    propio = np.einsum('ik,ik->k', E, W)
+    if mode == 'nodos':
+        v_th, z_th = diferencia, propio
+        with np.errstate(divide='ignore', invalid='ignore'):
+            i_n = v_th / z_th
+    else:
+        i_n = diferencia
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_th = 1 / propio
+            v_th = i_n * z_th
+    return x, v_th, z_th, i_n
+
+# 6.8 Simulación Transitoria (Euler Implícito / Trapecio)
+# Mismo circuito que 6.6 (componentes entre mallas o nodos), ahora en el tiempo y
+# con valores reales. Con paso h fijo cada elemento reactivo se reemplaza por su
+# modelo compañero: w = k·y + hist, donde hist solo depende del paso anterior.
+# En nodos y = tensión del elemento, w = corriente; en mallas es al revés.
+#   derivativo (C en nodos, L en mallas), w = a·dy/dt:
+#       euler: k = a/h,  hist' = -k·y          trapecio: k = 2a/h, hist' = -k·y - w
+#   integral (L en nodos, C en mallas), dw/dt = y/a:
+#       euler: k = h/a,  hist' = w             trapecio: k = h/2a, hist' = w + k·y
+# A = E·diag(k)·Eᵀ no cambia entre pasos: se invierte una vez por estado de los
+# interruptores (como en 6.3). Con G = E_rᵀ·A⁻¹ la historia de los reactivos sigue
+#   hist_{n+1} = T·hist_n + C·b_n,   x_n = A⁻¹·b_n - P·hist_n   (P = A⁻¹·E_r)
+# así que el bucle por paso es un solo producto de tamaño (reactivos)²; b y x se
+# calculan por bloques de pasos y nunca se guarda la historia completa.
+METODOS_TRANSITORIO = ('euler', 'trapecio')
+FORMAS_FUENTE = ('dc', 'escalon', 'seno', 'pulso')
+
+def transient_parameters(tipos, valores, mode='mallas'):
+    tipos = np.asarray(tipos)
+    v = np.asarray(valores, dtype=float)
+    # R, L o C equivalente (G, Γ y D son los recíprocos)
+    valor = np.where(np.isin(tipos, ('G', 'Γ', 'D')), 1 / v, v)
+    inductivo = np.isin(tipos, ('L', 'Γ'))
+    capacitivo = np.isin(tipos, ('C', 'D'))
+    derivativo = capacitivo if mode == 'nodos' else inductivo
+    return valor, ~(inductivo | capacitivo), derivativo
+
+def source_matrix(fuentes, t, n):
+    B = np.zeros((len(t), n))
+    for f in fuentes:
+        activo = t >= f["retardo"]
+        fase = t - f["retardo"]
+        if f["forma"] == 'dc':
+            onda = np.full(len(t), f["amplitud"])
+        elif f["forma"] == 'escalon':
+            onda = np.where(activo, f["amplitud"], 0.0)
+        elif f["forma"] == 'seno':
+            onda = np.where(activo, f["amplitud"] * np.sin(2*math.pi*f["frecuencia"]*fase + math.radians(f["fase"])), 0.0)
+        else:
+            onda = np.where(activo & (np.mod(fase, f["periodo"]) < f["ancho"]), f["amplitud"], 0.0)
+        B[:, f["en"] - 1] += onda
+    return B
+
+class SimuladorTransitorio:
+    def __init__(self, tipos, valores, pares, n, h, metodo='trapecio', mode='mallas', interruptores=()):
+        if metodo not in METODOS_TRANSITORIO:
+            raise ValueError(f"Método '{metodo}' desconocido (use {', '.join(METODOS_TRANSITORIO)})")
+        self.n, self.h, self.metodo, self.mode = n, h, metodo, mode
+        self.pares = list(pares)
+        self.valor, self.resistivo, self.derivativo = transient_parameters(tipos, valores, mode)
+        self.reactivo = np.flatnonzero(~self.resistivo)
+        self.E_r = np.zeros((n, len(self.reactivo)))
+        for col, e in enumerate(self.reactivo):
+            p, q = self.pares[e]
+            if p > 0: self.E_r[p-1, col] = 1.0
+            if q > 0: self.E_r[q-1, col] = -1.0
+        # Interruptores (par, R cerrado, R abierto, cerrado al inicio, tiempos de cambio):
+        # cada cambio rige desde el primer paso con t_n >= t_cambio
+        self.interruptores = []
+        for par, r_on, r_off, inicial, cambios in interruptores:
+            k_on, k_off = (r_on, r_off) if mode == 'mallas' else (1 / r_on, 1 / r_off)
+            pasos_cambio = np.sort([max(1, math.ceil(tc / h - 1e-9)) for tc in cambios]).astype(int)
+            self.interruptores.append((par, k_on, k_off, bool(inicial), pasos_cambio))
+        self._estados = {}
+
+    def _companion(self, metodo):
+        # k de todos los elementos y coeficientes de hist' = α·y + β·w de los reactivos
+        factor = 2.0 if metodo == 'trapecio' else 1.0
+        v, d = self.valor, self.derivativo
+        k = np.where(d, factor * v / self.h, self.h / (factor * v))
+        k[self.resistivo] = (v if self.mode == 'mallas' else 1 / v)[self.resistivo]
+        k_r, d = k[self.reactivo], d[self.reactivo]
+        if metodo == 'trapecio':
+            alfa, beta = np.where(d, -k_r, k_r), np.where(d, -1.0, 1.0)
+        else:
+            alfa, beta = np.where(d, -k_r, 0.0), np.where(d, 0.0, 1.0)
+        return k, alfa, beta
+
+    def _matrices(self, estado, metodo):
+        if (estado, metodo) not in self._estados:
+            k, alfa, beta = self._companion(metodo)
+            A = np.zeros((self.n, self.n))
+            filas, cols, idx, signos = element_stamps(self.pares + [s[0] for s in self.interruptores])
+            k = np.concatenate([k, [k_on if cerrado else k_off
+                                    for cerrado, (_, k_on, k_off, _, _) in zip(estado, self.interruptores)]])
+            np.add.at(A, (filas, cols), k[idx] * signos)
+            try:
+                inv = np.linalg.inv(A)
+            except np.linalg.LinAlgError:
+                raise ValueError("Matriz singular: revise que todo nodo/malla tenga un camino")
+            k_r = k[self.reactivo]
+            c = alfa + beta * k_r
+            G = self.E_r.T @ inv
+            T = np.diag(beta) - c[:, None] * (G @ self.E_r)
+            self._estados[estado, metodo] = (inv, T, c[:, None] * G, inv @ self.E_r, k_r, alfa, beta)
+        return self._estados[estado, metodo]
+
+    def _estado(self, paso):
+        return tuple(inicial != (np.searchsorted(cambios, paso, side='right') % 2 == 1)
+                     for (_, _, _, inicial, cambios) in self.interruptores)
+
+    def _tramos(self, pasos):
+        # Tramos [inicio, fin) de pasos (t_n = n·h, n = 1..pasos) sin cambios de interruptores
+        cortes = {1, pasos + 1}
+        for (_, _, _, _, cambios) in self.interruptores:
+            cortes.update(int(c) for c in cambios if c <= pasos)
+        cortes = sorted(cortes)
+        return zip(cortes[:-1], cortes[1:])
+
+    def _metodos(self):
+        # El trapecio arrastra la corriente/tensión previa a una discontinuidad (t = 0 o
+        # un cambio de interruptor) y oscila; como en SPICE, ese primer paso va con Euler.
+        return ('euler', 'trapecio') if self.metodo == 'trapecio' else ('euler',)
+
+    def prepare(self, pasos):
+        for inicio, _ in self._tramos(pasos):
+            for metodo in self._metodos():
+                self._matrices(self._estado(inicio), metodo)
+
+    def simulate(self, fuentes, pasos, cada=1, bloque=None):
+        # Genera (t, X) por bloques; X tiene una fila por paso guardado (cada `cada` pasos).
+        # Entre tramos se pasa el estado (y, w) de los reactivos, que parten descargados.
+        # El bloque no depende de `cada`: la máscara de abajo elige las filas a guardar,
+        # así la memoria queda en bloque x n aunque se guarde un paso cada millones
+        bloque = bloque or TRANSITORIO_BLOQUE
+        y = w = np.zeros(len(self.reactivo))
+        for inicio, fin in self._tramos(pasos):
+            estado = self._estado(inicio)
+            if self.metodo == 'trapecio':
+                inv, _, _, _, k_r, alfa, beta = self._matrices(estado, 'euler')
+                hist = alfa * y + beta * w
+                t = np.array([inicio * self.h])
+                x = inv @ (source_matrix(fuentes, t, self.n)[0] - self.E_r @ hist)
+                y = self.E_r.T @ x
+                w = k_r * y + hist
+                if inicio % cada == 0:
+                    yield t, x[None, :]
+                inicio += 1
+                if inicio == fin:
+                    continue
+            inv, T, C, P, k_r, alfa, beta = self._matrices(estado, self.metodo)
+            hist = alfa * y + beta * w
+            for a in range(inicio, fin, bloque):
+                pasos_bloque = np.arange(a, min(a + bloque, fin))
+                t = pasos_bloque * self.h
+                B = source_matrix(fuentes, t, self.n)
+                H = np.empty((len(t), len(hist)))
+                if len(hist):
+                    U = B @ C.T
+                    for i in range(len(t)):
+                        H[i] = hist
+                        hist = T @ hist + U[i]
+                guardar = pasos_bloque % cada == 0
+                if guardar.any():
+                    yield t[guardar], B[guardar] @ inv.T - H[guardar] @ P.T
+            # Estado al final del tramo (último paso calculado)
+            y = self.E_r.T @ (inv @ B[-1] - P @ H[-1])
+            w = k_r * y + H[-1]
+
+# 6.9 Reducción de Kron (Eliminación de Nodos Internos)
+# Con los nodos divididos en terminales (t) e internos (i):
+#   Y_red = Y_tt - Y_ti·Y_ii⁻¹·Y_it      (complemento de Schur)
+#   I_eq  = I_t - Y_ti·Y_ii⁻¹·I_i         (inyecciones internas llevadas a los terminales)
+# Una sola factorización de Y_ii da K = Y_ii⁻¹·Y_it y d = Y_ii⁻¹·I_i. Luego cada
+# resolución con otras inyecciones en los terminales es un producto O(t²) con la
+# inversa de Y_red (6.3), y los internos se recuperan con V_i = d - K·V_t.
+class ReduccionKron:
+    def __init__(self, A, b, terminales):
+        A = np.asarray(A, dtype=complex)
+        b = np.asarray(b, dtype=complex)
+        t = self.terminales = np.asarray(terminales, dtype=int)
+        i = self.internos = np.setdiff1d(np.arange(A.shape[0]), t)
+        Y_ti = A[np.ix_(t, i)]
+        try:
+            KD = np.linalg.solve(A[np.ix_(i, i)], np.column_stack([A[np.ix_(i, t)], b[i]]))
+        except np.linalg.LinAlgError:
+            raise ValueError("El bloque de nodos internos es singular: no se pueden eliminar")
+        self.K, self.d = KD[:, :-1], KD[:, -1]
+        self.Y_red = A[np.ix_(t, t)] - Y_ti @ self.K
+        self.traslado = Y_ti @ self.d
+        self.I_eq = b[t] - self.traslado
+        try:
+            self.factor = Factorizacion(self.Y_red)
+        except np.linalg.LinAlgError:
+            raise ValueError("La matriz reducida es singular")
+
+    def solve(self, I_t=None):
+        # I_t (t,) o (t, k): inyecciones en los terminales; None = las del caso original
+        I = self.I_eq if I_t is None else np.asarray(I_t, dtype=complex) - \
+            (self.traslado if np.ndim(I_t) == 1 else self.traslado[:, None])
+        V_t = self.factor.solve(I)
+        V_i = (self.d if V_t.ndim == 1 else self.d[:, None]) - self.K @ V_t
+        return V_t, V_i
+
+# 6.10 Descomposición en Bloques Independientes
+# Si el grafo de dispersión de A (i ~ j cuando A[i,j] o A[j,i] no es cero) tiene
+# varias componentes conexas, A es diagonal por bloques tras reordenar y cada
+# subcircuito se resuelve por separado: el costo pasa de O(n³) a la suma de los
+# O(m³) de cada bloque. Las componentes salen de una búsqueda en anchura sobre la
+# matriz booleana de dispersión (cada fila se visita una vez: O(n²) en total, sin
+# bucles por arista en Python). Los bloques pequeños del mismo tamaño se resuelven
+# apilados en una sola llamada; los grandes, en paralelo (LAPACK libera el GIL).
+def componentes_conexas(A):
+    S = A != 0
+    S |= S.T
+    etiqueta = np.full(A.shape[0], -1)
+    bloque = 0
+    for semilla in range(A.shape[0]):
+        if etiqueta[semilla] >= 0:
+            continue
+        # Búsqueda en anchura: cada nivel es un OR de las filas de la frontera
+        frontera = np.array([semilla])
+        etiqueta[semilla] = bloque
+        while frontera.size:
+            frontera = np.flatnonzero(S[frontera].any(axis=0) & (etiqueta < 0))
+            etiqueta[frontera] = bloque
+        bloque += 1
+    return etiqueta
+
+def bloques_pool():
+    return process_pool('bloque', BLOQUES_HILOS)
+
+def solve_por_bloques(A, b):
+    # None si A no se separa (un solo bloque): el llamador resuelve el sistema entero
+    etiquetas = componentes_conexas(A)
+    if etiquetas.max() == 0:
+        return None
+    orden = np.argsort(etiquetas, kind='stable')
+    bloques = np.split(orden, np.flatnonzero(np.diff(etiquetas[orden])) + 1)
+    x = np.empty(A.shape[0], dtype=complex)
+    grandes = [blk for blk in bloques if len(blk) >= BLOQUE_PARALELO_MIN_N]
+    pequenos = {}
+    for blk in bloques:
+        if len(blk) < BLOQUE_PARALELO_MIN_N:
+            pequenos.setdefault(len(blk), []).append(blk)
+    for m, grupo in pequenos.items():
+        check_deadline()
+        idx = np.stack(grupo)                                    # (k, m)
+        x[idx] = np.linalg.solve(A[idx[:, :, None], idx[:, None, :]], b[idx][..., None])[..., 0]
+    if len(grandes) == 1:
+        blk = grandes[0]
+        x[blk] = np.linalg.solve(A[np.ix_(blk, blk)], b[blk])
+    elif grandes:
+        # Vencimiento y etapa se leen una vez: el plazo no se vuelve a consultar mientras se espera
+        plazo = current_deadline()
+        vence = time.monotonic() + plazo.restante() if plazo is not None else None
+        etapa = plazo.etapa if plazo is not None else None
+        futuros = [(blk, bloques_pool().submit(np.linalg.solve, A[np.ix_(blk, blk)], b[blk])) for blk in grandes]
+        for blk, futuro in futuros:
+            try:
+                x[blk] = futuro.result(timeout=max(0.0, vence - time.monotonic()) if vence is not None else None)
+            except FutureTimeout:
+                for _, otro in futuros:
+                    otro.cancel()
+                raise PlazoVencido(etapa)
+    return x
+
 # 7. Gráfico Fasorial (Matplotlib)
-# ... (Sin cambios) ...
+# Todos los fasores se dibujan con un único quiver sobre una figura plantilla
+# (una por hilo) que se reutiliza entre renders: ejes, rejilla y márgenes fijos
+# se crean una sola vez y solo cambian los datos.
+_FASOR_TLS = threading.local()
+
+def _fasor_template():
+    plantilla = getattr(_FASOR_TLS, 'plantilla', None)
+    if plantilla is None:
+        fig = Figure(figsize=(5,5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        ax.set_aspect('equal', 'box')
+        ax.axhline(0, color="#999", linewidth=0.6)
+        ax.axvline(0, color="#999", linewidth=0.6)
+        ax.grid(True, linestyle=':', alpha=0.5)
+        fig.subplots_adjust(left=0.14, right=0.96, bottom=0.08, top=0.93)
+        plantilla = _FASOR_TLS.plantilla = {"fig": fig, "ax": ax, "dinamicos": []}
+    return plantilla
+
+def _fasor_labels(I, maxr):
+    # Con muchos fasores se rotulan solo los mayores que no se solapan con otro ya rotulado
+    if I.size <= FASOR_ETIQUETAS_MAX:
+        return np.arange(I.size)
+    candidatos = np.argsort(-np.abs(I), kind='stable')[:FASOR_ETIQUETAS_MAX * 10]
+    separacion = FASOR_SEPARACION * maxr
+    elegidos = []
+    for k in candidatos:
+        if not elegidos or np.min(np.abs(I[elegidos] - I[k])) >= separacion:
+            elegidos.append(k)
+            if len(elegidos) == FASOR_ETIQUETAS_MAX:
+                break
+    return np.array(elegidos, dtype=int)
+
 def make_fasor_png(currents, mode="mallas"):
-    I = np.array(currents, dtype=complex)
+    I = np.array(currents, dtype=complex).ravel()
     label_pref = "I" if mode == 'mallas' else "V"
     plot_title = "Fasores de Corriente" if mode == 'mallas' else "Fasores de Voltaje"
+    buf = io.BytesIO()
     
     if I.size == 0:
-        fig, ax = plt.subplots(figsize=(4,3))
+        fig = Figure(figsize=(4,3))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
         ax.text(0.5, 0.5, "Sin datos", ha='center', va='center')
         ax.axis('off')
+        fig.savefig(buf, format='png')
     else:
+        plantilla = _fasor_template()
+        fig, ax = plantilla["fig"], plantilla["ax"]
+        for artista in plantilla["dinamicos"]:
+            artista.remove()
         mags = np.abs(I)
         maxr = max(1e-6, np.max(mags)) * 1.2
-        fig, ax = plt.subplots(figsize=(5,5))
-        ax.set_aspect('equal', 'box')
+        colors = np.array(FASOR_COLORES)[np.arange(I.size) % len(FASOR_COLORES)]
+        flechas = ax.quiver(np.zeros(I.size), np.zeros(I.size), I.real, I.imag, color=colors,
+                            angles='xy', scale_units='xy', scale=1,
+                            width=0.006, headwidth=4, headlength=5, headaxislength=4.5)
+        textos = []
+        compacto = I.size > FASOR_ETIQUETAS_MAX
+        for idx in _fasor_labels(I, maxr):
+            z = I[idx]
+            mag, ang = rect_to_polar(z)
+            rotulo = f"{label_pref}{idx+1}" if compacto else f"{label_pref}{idx+1}\n{mag:.3f}∠{ang:.1f}°"
+            textos.append(ax.text(z.real*1.05, z.imag*1.05, rotulo, fontsize=9))
+        plantilla["dinamicos"] = [flechas] + textos
         ax.set_xlim(-maxr, maxr)
         ax.set_ylim(-maxr, maxr)
-        ax.axhline(0, color="#999", linewidth=0.6)
-        ax.axvline(0, color="#999", linewidth=0.6)
-        colors = plt.cm.tab10.colors
-        for idx, z in enumerate(I):
-            ax.arrow(0, 0, z.real, z.imag, head_width=maxr*0.03, head_length=maxr*0.05,
-                     length_includes_head=True, color=colors[idx % len(colors)], linewidth=2)
-            mag, ang = rect_to_polar(z)
-            ax.text(z.real*1.05, z.imag*1.05, f"{label_pref}{idx+1}\n{mag:.3f}∠{ang:.1f}°", fontsize=9)
-        
         ax.set_title(plot_title)
-        ax.grid(True, linestyle=':', alpha=0.5)
-        plt.tight_layout()
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    plt.close(fig)
+        check_deadline()
+        fig.savefig(buf, format='png')
     buf.seek(0)
     return buf
 
 # 8. Generador de PDF (ReportLab)
-# ... (Sin cambios) ...
-def create_pdf_bytes(A_strings, b_strings, x_solution, fasor_png_bytes, A_numpy, b_numpy, mode="mallas", title=PDF_TITLE):
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=20*mm, rightMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
+# El diagrama fasorial del reporte se dibuja como gráficos vectoriales de
+# ReportLab (líneas y polígonos), sin pasar por matplotlib ni por un PNG.
+def make_fasor_drawing(currents, mode="mallas", size=140*mm):
+    I = np.array(currents, dtype=complex).ravel()
+    label_pref = "I" if mode == 'mallas' else "V"
+    d = Drawing(size, size)
+    c = size / 2
+    radio = c - 12*mm
+    gris = colors.Color(0.6, 0.6, 0.6)
+    d.add(Line(c - radio, c, c + radio, c, strokeColor=gris, strokeWidth=0.6))
+    d.add(Line(c, c - radio, c, c + radio, strokeColor=gris, strokeWidth=0.6))
+    if I.size == 0:
+        d.add(String(c, c + 4*mm, "Sin datos", textAnchor='middle', fontSize=10))
+        return d
+    maxr = max(1e-6, np.max(np.abs(I))) * 1.2
+    escala = radio / maxr
+    # Círculos de referencia al 25/50/75/100% del radio, rotulados sobre el eje real
+    for f in (0.25, 0.5, 0.75, 1.0):
+        d.add(Circle(c, c, radio * f, fillColor=None, strokeColor=gris, strokeWidth=0.4, strokeDashArray=[1, 2]))
+        d.add(String(c + radio * f, c - 3.5*mm, f"{maxr * f:.3g}", textAnchor='middle', fontSize=6, fillColor=gris))
+    X, Y = c + I.real * escala, c + I.imag * escala
+    ang = np.angle(I)
+    largo = np.minimum(4*mm, np.abs(I) * escala * 0.35)
+    ancho = largo * 0.45
+    bx, by = X - largo * np.cos(ang), Y - largo * np.sin(ang)
+    for k in range(I.size):
+        r, g, b = FASOR_COLORES[k % len(FASOR_COLORES)]
+        color = colors.Color(r, g, b)
+        d.add(Line(c, c, bx[k], by[k], strokeColor=color, strokeWidth=1.2))
+        d.add(Polygon([X[k], Y[k],
+                       bx[k] - ancho[k] * np.sin(ang[k]), by[k] + ancho[k] * np.cos(ang[k]),
+                       bx[k] + ancho[k] * np.sin(ang[k]), by[k] - ancho[k] * np.cos(ang[k])],
+                      fillColor=color, strokeColor=color, strokeWidth=0.1))
+    compacto = I.size > FASOR_ETIQUETAS_MAX
+    for idx in _fasor_labels(I, maxr):
+        mag, angulo = rect_to_polar(I[idx])
+        rotulo = f"{label_pref}{idx+1}" if compacto else f"{label_pref}{idx+1} = {mag:.3f} / {angulo:.1f}°"
+        x = c + I[idx].real * escala * 1.05
+        d.add(String(x, c + I[idx].imag * escala * 1.05, rotulo, fontSize=8,
+                     textAnchor='end' if x < c else 'start'))
+    return d
+
+def pdf_styles():
     styles = getSampleStyleSheet()
     
     if 'Code' not in styles:
         styles.add(ParagraphStyle(name='Code', parent=styles['Normal'], fontName='Courier'))
-    
+    return styles
+
+# Tablas, procedimiento y diagrama de un caso (sin encabezado del documento)
+def case_story(A_strings, b_strings, x_solution, A_numpy, b_numpy, mode, styles):
     if mode == 'nodos':
         label_mat_a = "Matriz A (Admitancias)"
         label_vec_b = "Vector b (Fuentes de Corriente)"
@@ -237,10 +1397,6 @@ def create_pdf_bytes(A_strings, b_strings, x_solution, fasor_png_bytes, A_numpy,
         label_proc_pref = "I"
     
     story = []
-    story.append(Paragraph(f"CircuitSolve - Reporte de {label_resultados.split(' ')[1]}", styles['Title']))
-    story.append(Spacer(1, 6*mm))
-    story.append(Paragraph(f"Generado: {time.strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    story.append(Spacer(1, 8*mm))
     story.append(Paragraph(label_mat_a, styles['Heading3']))
     story.append(Table(A_strings, hAlign='LEFT'))
     story.append(Spacer(1, 6*mm))
@@ -284,22 +1440,78 @@ def create_pdf_bytes(A_strings, b_strings, x_solution, fasor_png_bytes, A_numpy,
         story.append(Paragraph(f"{label_proc_pref}2 = Δ2 / Δ = {format_rect(x_solution[1], 6)}", styles['Code']))
         story.append(Spacer(1, 8*mm))
 
-    if fasor_png_bytes is not None:
-        try:
-            story.append(PageBreak()) 
-            story.append(Paragraph(label_fasor, styles['Heading3']))
-            story.append(Spacer(1, 4*mm))
-            fasor_png_bytes.seek(0) 
-            img = Image(fasor_png_bytes, width=140*mm, height=140*mm)
-            img.hAlign = 'CENTER'
-            story.append(img)
-        except Exception as e:
-            story.append(Paragraph(f"Error al insertar imagen Fasor: {e}", styles['Normal']))
-                
+    try:
+        story.append(PageBreak())
+        story.append(Paragraph(label_fasor, styles['Heading3']))
+        story.append(Spacer(1, 4*mm))
+        diagrama = make_fasor_drawing(x_solution, mode=mode)
+        diagrama.hAlign = 'CENTER'
+        story.append(diagrama)
+    except Exception as e:
+        story.append(Paragraph(f"Error al dibujar el diagrama fasorial: {e}", styles['Normal']))
+    return story
+
+def create_pdf_bytes(A_strings, b_strings, x_solution, A_numpy, b_numpy, mode="mallas", title=PDF_TITLE):
+    buf = io.BytesIO()
+    doc = DocumentoReporte(buf, pagesize=A4, leftMargin=20*mm, rightMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
+    styles = pdf_styles()
+    magnitud = "Voltajes" if mode == 'nodos' else "Corrientes"
+    story = []
+    story.append(Paragraph(f"CircuitSolve - Reporte de {magnitud}", styles['Title']))
+    story.append(Spacer(1, 6*mm))
+    story.append(Paragraph(f"Generado: {time.strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    story.append(Spacer(1, 8*mm))
+    story.extend(case_story(A_strings, b_strings, x_solution, A_numpy, b_numpy, mode, styles))
     doc.build(story)
     buf.seek(0)
     return buf
 
+# Reporte de varios casos: se preparan las tablas y el diagrama de cada caso y el
+# documento se arma al final con un índice. multiBuild hace las pasadas necesarias
+# para que el índice tenga los números de página correctos. Todo es Python puro
+# (retenido por el GIL), así que se hace en serie. Si el plazo de preparación
+# vence, el reporte sale con los casos ya listos.
+class DocumentoReporte(SimpleDocTemplate):
+    def afterFlowable(self, flowable):
+        check_deadline() # El armado se puede cancelar entre elementos
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'Heading1':
+            marca = f"caso{self.seq.nextf('caso')}"
+            self.canv.bookmarkPage(marca)
+            self.notify('TOCEntry', (0, flowable.getPlainText(), self.page, marca))
+
+def create_batch_pdf_bytes(casos, title=PDF_TITLE):
+    buf = io.BytesIO()
+    doc = DocumentoReporte(buf, pagesize=A4, leftMargin=20*mm, rightMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm,
+                           title=title)
+    styles = pdf_styles()
+    plazo = current_deadline()
+    partes = []
+    for k, caso in enumerate(casos):
+        if plazo is not None and plazo.restante() <= 0:
+            break
+        encabezado = f"Caso {k+1}" + (f": {caso['titulo']}" if caso.get("titulo") else "")
+        cuerpo = case_story(caso["A_strings"], caso["b_strings"], caso["x"], caso["A_numpy"],
+                            caso["b_numpy"], caso["mode"], styles)
+        partes.append([Paragraph(escape(encabezado), styles['Heading1'])] + cuerpo + [PageBreak()])
+    if not partes and casos:
+        raise PlazoVencido(plazo.etapa if plazo is not None else "pdf")
+
+    indice = TableOfContents()
+    resumen = f"{len(casos)} casos" if len(partes) == len(casos) else \
+        f"Reporte parcial: {len(partes)} de {len(casos)} casos (tiempo agotado)"
+    story = [Paragraph(escape(title), styles['Title']), Spacer(1, 6*mm),
+             Paragraph(f"Generado: {time.strftime('%Y-%m-%d %H:%M:%S')} · {resumen}", styles['Normal']),
+             Spacer(1, 8*mm), Paragraph("Índice", styles['Heading2']), indice, PageBreak()]
+    for parte in partes:
+        story.extend(parte)
+    if plazo is not None:
+        with plazo.en('ensamblado'):
+            doc.multiBuild(story)
+    else:
+        doc.multiBuild(story)
+    buf.seek(0)
+    return buf, len(partes)
+
 # 9. Plantilla HTML (Frontend)
 HTML_TEMPLATE = """
 <!doctype html>
@@ -308,8 +1520,9 @@ HTML_TEMPLATE = """
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>CircuitSolve - Análisis de Circuitos AC</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script>
+    <link href="/vendor/bootstrap-5.3.2/css/bootstrap.min.css" rel="stylesheet">
+    <script src="/vendor/bootstrap-5.3.2/js/popper.min.js"></script>
+    <script src="/vendor/bootstrap-5.3.2/js/bootstrap.min.js"></script>
     
     <style>
       /* 1. Fuente y Fondo */
@@ -647,6 +1860,7 @@ HTML_TEMPLATE = """
                 <option value="auto">Auto</option>
                 <option value="cramer">Cramer</option>
                 <option value="gauss">Gauss</option>
+                <option value="secuencias">Secuencias (3φ)</option>
               </select>
             </div>
             <div class="col-auto pt-4">
@@ -729,7 +1943,7 @@ HTML_TEMPLATE = """
               <h5 id="labelFasor">Diagrama fasorial (Corrientes)</h5>
               <div id="fasorArea" class="text-center">
                 <a href="#" data-bs-toggle="modal" data-bs-target="#fasorModal">
-                  <img id="fasorImg" class="fasor-img" src="/fasor.png?ts=0" alt="Fasor">
+                  <img id="fasorImg" class="fasor-img" src="/fasor.png" alt="Fasor">
                 </a>
               </div>
             </div>
@@ -794,7 +2008,7 @@ HTML_TEMPLATE = """
       <div class="modal-dialog modal-lg modal-dialog-centered">
         <div class="modal-content" style="background-color: transparent; border: none;">
           <div class="modal-body text-center p-0">
-            <img id="modalFasorImg" src="/fasor.png?ts=0" class="img-fluid" alt="Diagrama Fasorial" style="border-radius: 12px; background: #fff;">
+            <img id="modalFasorImg" src="/fasor.png" class="img-fluid" alt="Diagrama Fasorial" style="border-radius: 12px; background: #fff;">
           </div>
         </div>
       </div>
@@ -804,6 +2018,17 @@ HTML_TEMPLATE = """
       let debounceTimer = null;
       const debounceDelay = 700;
       let currentMode = 'mallas';
+      const sessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Math.random()).slice(2) + String(Date.now());
+      // Celdas editadas desde la última solución aceptada por el servidor (se envían como PATCH)
+      const maxPatchCells = 32;
+      const dirtyCells = new Set();
+      let serverSynced = false;
+      let syncedN = 0;
+      // Modo en vivo (SSE): ediciones por POST, resultados por el flujo de la sesión
+      const liveDelay = 50;
+      let liveSource = null;
+      let liveTimer = null;
+      const liveSent = new Map(); // generación -> celdas enviadas en esa edición
 
       function parseJSValue(str) {
           str = String(str).trim();
@@ -1131,6 +2356,8 @@ HTML_TEMPLATE = """
         contA.innerHTML = htmlA;
         contB.innerHTML = htmlB;
         
+        serverSynced = false;
+        dirtyCells.clear();
         setInputChangeHandlers();
         setMode(currentMode);
       }
@@ -1139,7 +2366,10 @@ HTML_TEMPLATE = """
         const inputs = document.querySelectorAll('#matrixForm input');
         inputs.forEach(function(inp) {
           inp.addEventListener('input', function() {
-            if (document.getElementById('autoSolveSwitch').checked) {
+            dirtyCells.add(inp.name);
+            if (liveSource) {
+              scheduleLive();
+            } else if (document.getElementById('autoSolveSwitch').checked) {
               if (debounceTimer) clearTimeout(debounceTimer);
               debounceTimer = setTimeout(function() {
                 doSolve(false);
@@ -1168,6 +2398,58 @@ HTML_TEMPLATE = """
         return {matrix: A, vector: b, method: document.getElementById('methodSelect').value, mode: currentMode};
       }
 
+      function collectPatch(sent) {
+        const cells = [];
+        const vector = [];
+        dirtyCells.forEach(function(name) {
+          const el = document.querySelector('[name="' + name + '"]');
+          if (!el) return;
+          sent.set(name, el.value);
+          const parts = name.split('_');
+          if (parts[0] === 'A') {
+            cells.push({i: parseInt(parts[1]), j: parseInt(parts[2]), value: el.value});
+          } else {
+            vector.push({i: parseInt(parts[1]), value: el.value});
+          }
+        });
+        return {cells: cells, vector: vector, method: document.getElementById('methodSelect').value, mode: currentMode};
+      }
+
+      function markSent(sent) {
+        // Una celda vuelve a editarse mientras viaja la petición: sigue pendiente
+        sent.forEach(function(value, name) {
+          const el = document.querySelector('[name="' + name + '"]');
+          if (el && el.value === value) dirtyCells.delete(name);
+        });
+      }
+
+      async function sendSolve() {
+        const n = parseInt(document.getElementById('nSize').value || 3);
+        const url = '/matrix/' + encodeURIComponent(sessionId);
+        const headers = {'Content-Type':'application/json'};
+        if (serverSynced && syncedN === n && dirtyCells.size <= maxPatchCells) {
+          const sent = new Map();
+          const res = await fetch(url, {method: 'PATCH', headers: headers, body: JSON.stringify(collectPatch(sent))});
+          if (res.status !== 409) {
+            if (res.ok) markSent(sent);
+            return res;
+          }
+        }
+        const payload = collectForm();
+        const sent = new Map();
+        dirtyCells.forEach(function(name) {
+          const el = document.querySelector('[name="' + name + '"]');
+          if (el) sent.set(name, el.value);
+        });
+        const res = await fetch(url, {method: 'PUT', headers: headers, body: JSON.stringify(payload)});
+        serverSynced = res.ok;
+        if (res.ok) {
+          syncedN = payload.matrix.length;
+          markSent(sent);
+        }
+        return res;
+      }
+
       async function loadExample(type) {
         const n = parseInt(document.getElementById('nSize').value || {{default_size}});
         try {
@@ -1189,7 +2471,10 @@ HTML_TEMPLATE = """
               const elb = document.querySelector('[name="b_' + i + '"]');
               if (elb) elb.value = b[i];
             }
-            if (document.getElementById('autoSolveSwitch').checked) {
+            serverSynced = false;
+            if (liveSource) {
+              scheduleLive();
+            } else if (document.getElementById('autoSolveSwitch').checked) {
               doSolve(false);
             }
         } catch (e) {
@@ -1197,34 +2482,21 @@ HTML_TEMPLATE = """
         }
       }
 
+      function showError(errorMsg, verifMsg) {
+        document.getElementById('resultsRect').textContent = errorMsg;
+        document.getElementById('resultsPolar').textContent = errorMsg;
+        document.getElementById('verifRect').textContent = verifMsg;
+        document.getElementById('verifPolar').textContent = verifMsg;
+      }
+
       /*** ### FASE 3.7 - MODIFICADO ### Formato de Resultados y Verificación a Pestañas ***/
-      async function doSolve(downloadPdf) {
-        if (downloadPdf === undefined) { downloadPdf = false; }
-        const payload = collectForm();
-        
-        // Contenedores de pestañas
-        const outRect = document.getElementById('resultsRect');
-        const outPolar = document.getElementById('resultsPolar');
-        const verifRect = document.getElementById('verifRect');
-        const verifPolar = document.getElementById('verifPolar');
-        
-        try {
-            const res = await fetch('/solve', {
-              method: 'POST',
-              headers: {'Content-Type':'application/json'},
-              body: JSON.stringify(payload)
-            });
-            if (!res.ok) {
-              const err = await res.json();
-              const errorMsg = "ERROR: " + (err.error || JSON.stringify(err));
-              outRect.textContent = errorMsg;
-              outPolar.textContent = errorMsg;
-              verifRect.textContent = "ERROR";
-              verifPolar.textContent = "ERROR";
-              return;
-            }
-            const data = await res.json();
-            
+      function showResults(data, fasorSrc) {
+            // Contenedores de pestañas
+            const outRect = document.getElementById('resultsRect');
+            const outPolar = document.getElementById('resultsPolar');
+            const verifRect = document.getElementById('verifRect');
+            const verifPolar = document.getElementById('verifPolar');
+
             const resultPrefix = currentMode === 'mallas' ? 'I' : 'V';
             const unit = currentMode === 'mallas' ? 'A' : 'V';
             const verificationPrefix = currentMode === 'mallas' ? 'Malla' : 'Nodo';
@@ -1237,6 +2509,17 @@ HTML_TEMPLATE = """
               s_results_rect += `${name}= ${el.rect} ${unit}\n`;
               s_results_polar += `${name}= |${resultPrefix}|=${el.mag.toFixed(4)} ${unit}  ∠ ${el.angle.toFixed(4)}°\n`;
             });
+            if (data.secuencias) {
+              s_results_rect += `\nSecuencias (${data.estrategia})\n`;
+              s_results_polar += `\nSecuencias (${data.estrategia})\n`;
+              data.secuencias.forEach(function(seq, k) {
+                [['0', seq.cero], ['1', seq.positiva], ['2', seq.negativa]].forEach(function(par) {
+                  let name = (resultPrefix + (k+1) + '_' + par[0]).padEnd(6, ' ');
+                  s_results_rect += `${name}= ${par[1].rect} ${unit}\n`;
+                  s_results_polar += `${name}= ${par[1].mag.toFixed(4)} ${unit}  ∠ ${par[1].angle.toFixed(4)}°\n`;
+                });
+              });
+            }
             outRect.textContent = s_results_rect;
             outPolar.textContent = s_results_polar;
             
@@ -1254,23 +2537,123 @@ HTML_TEMPLATE = """
             // Actualizar imágenes
             const img = document.getElementById('fasorImg');
             const modalImg = document.getElementById('modalFasorImg');
-            const newSrc = '/fasor.png?ts=' + Date.now();
-            img.src = newSrc;
-            modalImg.src = newSrc;
-            
+            img.src = fasorSrc;
+            modalImg.src = fasorSrc;
+      }
+
+      async function doSolve(downloadPdf) {
+        if (downloadPdf === undefined) { downloadPdf = false; }
+        try {
+            const res = await sendSolve();
+            if (!res.ok) {
+              const err = await res.json();
+              showError("ERROR: " + (err.error || JSON.stringify(err)), "ERROR");
+              return;
+            }
+            const data = await res.json();
+            showResults(data, data.fasor_url);
             if (downloadPdf) {
-              /*** ### FASE 3.7 - CORRECCIÓN DE BUG (ts='D) ### ***/
-              window.location.href = '/download_pdf?ts=' + Date.now();
+              window.location.href = data.pdf_url;
             }
         } catch (e) {
             const errorMsg = "ERROR de conexión: " + e.message;
-            outRect.textContent = errorMsg;
-            outPolar.textContent = errorMsg;
-            verifRect.textContent = errorMsg;
-            verifPolar.textContent = errorMsg;
+            showError(errorMsg, errorMsg);
+        }
+      }
+
+      function scheduleLive() {
+        if (liveTimer) clearTimeout(liveTimer);
+        liveTimer = setTimeout(liveSend, liveDelay);
+      }
+
+      async function liveSend() {
+        // Igual que sendSolve: celdas sueltas si el servidor ya tiene la matriz, si no la completa
+        const n = parseInt(document.getElementById('nSize').value || 3);
+        const sent = new Map();
+        let payload;
+        if (serverSynced && syncedN === n && dirtyCells.size <= maxPatchCells) {
+          payload = collectPatch(sent);
+        } else {
+          payload = collectForm();
+          dirtyCells.forEach(function(name) {
+            const el = document.querySelector('[name="' + name + '"]');
+            if (el) sent.set(name, el.value);
+          });
+        }
+        try {
+          const res = await fetch('/live/' + encodeURIComponent(sessionId) + '/edit', {
+            method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify(payload)});
+          const data = await res.json();
+          if (res.ok) liveSent.set(data.generacion, sent);
+          else if (res.status === 409) {
+            // La edición no llegó al worker del flujo: se sigue con el modo normal
+            stopLive();
+            doSolve(false);
+          }
+          else if (res.status === 429) {
+            if (liveTimer) clearTimeout(liveTimer);
+            liveTimer = setTimeout(liveSend, (parseInt(res.headers.get('Retry-After')) || 1) * 1000);
+          }
+          else showError("ERROR: " + data.error, "ERROR");
+        } catch (e) {
+          showError("ERROR de conexión: " + e.message, "ERROR");
         }
       }
 
+      function settleLive(generacion, ok) {
+        // El resultado de una generación incluye todas las ediciones anteriores
+        liveSent.forEach(function(sent, g) {
+          if (g > generacion) return;
+          if (ok) markSent(sent);
+          liveSent.delete(g);
+        });
+      }
+
+      function startLive() {
+        if (liveSource || !window.EventSource) return;
+        liveSource = new EventSource('/live/' + encodeURIComponent(sessionId) + '/stream');
+        liveSource.addEventListener('resultado', function(ev) {
+          const data = JSON.parse(ev.data);
+          settleLive(data.generacion, true);
+          serverSynced = true;
+          syncedN = data.result.length;
+          showResults(data, data.fasor_png);
+        });
+        liveSource.addEventListener('error', function(ev) {
+          if (!ev.data) {
+            // Error de conexión: si el servidor rechazó el flujo, se vuelve al modo normal
+            if (liveSource && liveSource.readyState === EventSource.CLOSED) liveSource = null;
+            return;
+          }
+          const data = JSON.parse(ev.data);
+          settleLive(data.generacion, false);
+          if (data.codigo === 409) {
+            serverSynced = false;
+            scheduleLive();
+            return;
+          }
+          if (data.codigo === 429) {
+            // Servidor ocupado: las celdas siguen pendientes, se reenvían más tarde
+            if (liveTimer) clearTimeout(liveTimer);
+            liveTimer = setTimeout(liveSend, (data.reintentar || 1) * 1000);
+            return;
+          }
+          showError("ERROR: " + data.error, "ERROR");
+        });
+        liveSource.addEventListener('open', function() {
+          // Al reconectar el flujo puede ser de otro worker o de una sesión ya descartada
+          if (serverSynced || dirtyCells.size) {
+            serverSynced = false;
+            scheduleLive();
+          }
+        });
+      }
+
+      function stopLive() {
+        if (liveSource) liveSource.close();
+        liveSource = null;
+      }
+
       // ... (Botones sin cambios) ...
       document.getElementById('genBtn').addEventListener('click', function() {
         const n = Math.min(maxSize, Math.max(1, parseInt(document.getElementById('nSize').value || 3)));
@@ -1279,10 +2662,17 @@ HTML_TEMPLATE = """
       });
       document.getElementById('solveBtn').addEventListener('click', function() { doSolve(false); });
       document.getElementById('pdfBtn').addEventListener('click', function() { doSolve(true); });
+      document.getElementById('autoSolveSwitch').addEventListener('change', function() {
+        if (this.checked) startLive(); else stopLive();
+      });
+      document.getElementById('methodSelect').addEventListener('change', function() {
+        if (liveSource) scheduleLive();
+      });
 
       document.addEventListener('DOMContentLoaded', function() {
         const initialN = {{default_size}};
         makeMatrix(initialN);
+        if (document.getElementById('autoSolveSwitch').checked) startLive();
         calculateComponent('R');
         calculateComponent('L');
         calculateComponent('C');
@@ -1293,29 +2683,913 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# 10. Caché HTTP y Recursos Estáticos
+# Los recursos fijos (página principal, Bootstrap local) se comprimen una sola vez
+# al arrancar y se sirven con ETag fuerte y respuestas condicionales (304).
+def build_static_asset(data, mimetype):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    variantes = {"identity": data, "gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes["br"] = brotli.compress(data, quality=11)
+    return {"etag": hashlib.sha256(data).hexdigest()[:32], "mimetype": mimetype, "variantes": variantes}
+
+def send_static_asset(asset, cache_control):
+    for codificacion in ("br", "gzip"):
+        if codificacion in asset["variantes"] and request.accept_encodings[codificacion] > 0:
+            break
+    else:
+        codificacion = "identity"
+    # Cada codificación es una representación distinta: su propio ETag fuerte
+    etag = asset["etag"] if codificacion == "identity" else f'{asset["etag"]}-{codificacion}'
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(asset["variantes"][codificacion], mimetype=asset["mimetype"])
+        if codificacion != "identity":
+            resp.headers['Content-Encoding'] = codificacion
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = cache_control
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+def load_vendor_assets():
+    assets = {}
+    for raiz, _, archivos in os.walk(VENDOR_DIR):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            clave = os.path.relpath(ruta, VENDOR_DIR).replace(os.sep, '/')
+            with open(ruta, 'rb') as f:
+                data = f.read()
+            assets[clave] = build_static_asset(data, mimetypes.guess_type(nombre)[0] or 'application/octet-stream')
+    return assets
+
+VENDOR_ASSETS = load_vendor_assets()
+
+# 10.1 Artefactos Direccionados por Contenido
+# La imagen y el PDF de un caso se identifican con un hash de todo lo que los
+# determina. Sus URL son inmutables: navegador y proxy pueden reutilizarlas sin
+# llegar a un worker, y solo se dibujan la primera vez que alguien las pide.
+ARTEFACTOS_VERSION = "3" # Cambiar si cambia el dibujo del fasor o el PDF
+
+def _canonico(valor):
+    if isinstance(valor, np.ndarray):
+        # + 0.0 normaliza -0.0 para que valores iguales den el mismo hash
+        return (np.ascontiguousarray(valor, dtype=complex) + 0.0).tobytes()
+    return json.dumps(valor, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+def artifact_key(tipo, *partes):
+    h = hashlib.sha256(f"{ARTEFACTOS_VERSION}:{tipo}".encode('utf-8'))
+    for parte in partes:
+        datos = _canonico(parte)
+        h.update(len(datos).to_bytes(8, 'little'))
+        h.update(datos)
+    return h.hexdigest()[:40]
+
+# Memoria con presupuesto: las entradas más frías que superan el presupuesto de
+# RAM pasan a archivos temporales. Los PNG/PDF se sirven luego con mmap (sin
+# copiarlos al heap del worker) y las matrices grandes de un caso quedan como
+# np.memmap de solo lectura.
+_TEMPORAL = {"pid": None, "ruta": None}
+_TEMPORAL_LOCK = threading.Lock()
+
+def _ruta_temporal(sufijo):
+    with _TEMPORAL_LOCK:
+        # Un directorio por proceso: los workers de gunicorn nacen por fork
+        if _TEMPORAL["pid"] != os.getpid():
+            ruta = tempfile.mkdtemp(prefix='circuitsolve-', dir=ARTEFACTOS_TMP)
+            pid = os.getpid()
+
+            def limpiar():
+                if os.getpid() == pid:
+                    shutil.rmtree(ruta, ignore_errors=True)
+            atexit.register(limpiar)
+            _TEMPORAL.update(pid=pid, ruta=ruta)
+        fd, ruta = tempfile.mkstemp(suffix=sufijo, dir=_TEMPORAL["ruta"])
+    os.close(fd)
+    return ruta
+
+def _tamano_ram(valor):
+    if isinstance(valor, (bytes, bytearray)): return len(valor)
+    if isinstance(valor, np.memmap): return 0
+    if isinstance(valor, np.ndarray): return valor.nbytes
+    if isinstance(valor, dict): return sum(_tamano_ram(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)): return 8 * len(valor) + sum(_tamano_ram(v) for v in valor)
+    if isinstance(valor, str): return len(valor)
+    return 0
+
+class MemoriaPresupuestada:
+    def __init__(self, presupuesto, max_entradas):
+        self.presupuesto = presupuesto
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict() # clave -> {"valor", "ram", "archivo", "rutas", "en_disco"}
+        self.en_ram = 0
+        self.lock = threading.Lock()
+
+    def put(self, clave, valor):
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self._liberar(anterior)
+            entrada = {"valor": valor, "ram": _tamano_ram(valor), "archivo": None, "rutas": [], "en_disco": False}
+            self.entradas[clave] = entrada
+            self.en_ram += entrada["ram"]
+            while len(self.entradas) > self.max_entradas:
+                self._liberar(self.entradas.popitem(last=False)[1])
+            for entrada in self.entradas.values():
+                if self.en_ram <= self.presupuesto:
+                    break
+                if not entrada["en_disco"] and entrada["ram"] >= ESPILL_MIN:
+                    self._espillar(entrada)
+
+    def get(self, clave):
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                return None
+            self.entradas.move_to_end(clave)
+            if entrada["archivo"] is None:
+                return entrada["valor"]
+            ruta = entrada["archivo"]
+        # Un mmap por lectura: cada respuesta tiene su propia posición
+        try:
+            with open(ruta, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+    def _espillar(self, entrada):
+        valor = entrada["valor"]
+        entrada["en_disco"] = True
+        try:
+            if isinstance(valor, (bytes, bytearray)):
+                ruta = _ruta_temporal('.bin')
+                with open(ruta, 'wb') as f:
+                    f.write(valor)
+                entrada["rutas"].append(ruta)
+                entrada["archivo"], entrada["valor"] = ruta, None
+            elif isinstance(valor, dict):
+                nuevo = dict(valor)
+                for k, v in valor.items():
+                    if isinstance(v, np.ndarray) and not isinstance(v, np.memmap) and v.nbytes >= ESPILL_MIN:
+                        ruta = _ruta_temporal('.npy')
+                        entrada["rutas"].append(ruta)
+                        np.save(ruta, v)
+                        nuevo[k] = np.load(ruta, mmap_mode='r')
+                entrada["valor"] = nuevo
+        except OSError:
+            return # Sin espacio en disco: la entrada sigue en RAM
+        self.en_ram -= entrada["ram"]
+        entrada["ram"] = _tamano_ram(entrada["valor"])
+        self.en_ram += entrada["ram"]
+
+    def _liberar(self, entrada):
+        self.en_ram -= entrada["ram"]
+        # Los mmap ya entregados siguen siendo válidos tras borrar el archivo
+        for ruta in entrada["rutas"]:
+            try:
+                os.unlink(ruta)
+            except OSError:
+                pass
+
+CASOS = MemoriaPresupuestada(CASOS_RAM_MAX, MAX_CASOS) # clave -> datos necesarios para generar el artefacto
+ARTEFACTOS = MemoriaPresupuestada(ARTEFACTOS_RAM_MAX, MAX_ARTEFACTOS) # clave -> bytes ya generados
+
+def register_case(A_strings, b_strings, A, b, x, mode):
+    fasor_key = artifact_key('png', x, mode)
+    pdf_key = artifact_key('pdf', A_strings, b_strings, A, b, x, mode)
+    CASOS.put(fasor_key, {"x": x, "mode": mode})
+    CASOS.put(pdf_key, {"A_strings": A_strings, "b_strings": b_strings, "x": x, "A_numpy": A,
+                        "b_numpy": b, "mode": mode})
+    return fasor_key, pdf_key
+
+def _stored_artifact(clave):
+    guardado = ALMACEN.get(clave) if ALMACEN is not None else None
+    if guardado is None:
+        return None
+    data = bytes(guardado[0])
+    ARTEFACTOS.put(clave, data)
+    return data
+
+def _store_artifact(clave, tipo, data):
+    ARTEFACTOS.put(clave, data)
+    if ALMACEN is not None:
+        ALMACEN.put(clave, tipo, data)
+
+def get_fasor_png(clave):
+    data = ARTEFACTOS.get(clave) or _stored_artifact(clave)
+    if data is None:
+        caso = CASOS.get(clave)
+        if caso is None:
+            return None
+        data = make_fasor_png(caso["x"], mode=caso["mode"]).getvalue()
+        _store_artifact(clave, 'png', data)
+    return data
+
+def get_pdf(clave):
+    data = ARTEFACTOS.get(clave) or _stored_artifact(clave)
+    if data is None:
+        caso = CASOS.get(clave)
+        if caso is None:
+            return None
+        if "lote" in caso:
+            buf, incluidos = create_batch_pdf_bytes(caso["lote"], title=caso["titulo"])
+            if incluidos < len(caso["lote"]):
+                return PdfParcial(buf.getvalue(), incluidos, len(caso["lote"])) # No se guarda en caché
+            data = buf.getvalue()
+        else:
+            data = create_pdf_bytes(caso["A_strings"], caso["b_strings"], caso["x"],
+                                    caso["A_numpy"], caso["b_numpy"], caso["mode"]).getvalue()
+        _store_artifact(clave, 'pdf', data)
+    return data
+
+class PdfParcial(bytes):
+    # Reporte cortado por plazo: se entrega una vez, sin ETag ni caché
+    def __new__(cls, data, incluidos, total):
+        obj = super().__new__(cls, data)
+        obj.incluidos, obj.total = incluidos, total
+        return obj
+
+def send_artifact(data, etag, mimetype, inmutable, download_name=None):
+    if isinstance(data, PdfParcial):
+        resp = send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=download_name is not None,
+                         download_name=download_name, etag=False)
+        resp.cache_control.no_store = True
+        resp.headers['X-Reporte-Parcial'] = f"{data.incluidos}/{data.total}"
+        return resp
+    # send_file responde 304 si If-None-Match coincide con el ETag
+    volcado = isinstance(data, mmap.mmap)
+    try:
+        resp = send_file(data if volcado else io.BytesIO(data), mimetype=mimetype, etag=etag,
+                         as_attachment=download_name is not None, download_name=download_name,
+                         max_age=ARTEFACTOS_MAX_AGE if inmutable else None, conditional=not volcado)
+        if volcado:
+            # send_file no conoce el tamaño de un mmap: sin esto ignoraría Range y respondería 200
+            resp.content_length = len(data)
+            resp = resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    except RequestedRangeNotSatisfiable as e:
+        # Las vistas atrapan Exception (500): el 416 se responde desde aquí
+        if volcado:
+            data.close()
+        return e.get_response()
+    if inmutable:
+        resp.cache_control.immutable = True
+    return resp
+
+def not_modified(etag, inmutable):
+    resp = app.response_class(status=304)
+    resp.set_etag(etag)
+    if inmutable:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = ARTEFACTOS_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp
+
+# 10.2 Almacén Persistente de Resultados (SQLite)
+# Soluciones y artefactos ya generados sobreviven a los reinicios. La clave es el
+# mismo hash canónico de 10.1 (A y b ya parseados, método y modo), así que un caso
+# repetido se responde desde disco sin resolver ni dibujar. Se poda por LRU
+# cuando se superan ALMACEN_MAX_BYTES o ALMACEN_MAX_FILAS. Es una caché: cualquier
+# error de SQLite se ignora y la petición sigue por el camino normal.
+class AlmacenResultados:
+    def __init__(self, ruta, max_bytes=ALMACEN_MAX_BYTES, max_filas=ALMACEN_MAX_FILAS):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.max_filas = max_filas
+        self.local = threading.local()
+        with self._conexion() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS entradas (clave TEXT PRIMARY KEY, tipo TEXT NOT NULL, "
+                        "datos BLOB NOT NULL, meta TEXT, tamano INTEGER NOT NULL, usado REAL NOT NULL)")
+            con.execute("CREATE INDEX IF NOT EXISTS entradas_usado ON entradas (usado)")
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (los workers de gunicorn se crean con fork)
+        con = getattr(self.local, 'con', None)
+        if con is None or self.local.pid != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=5)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con, self.local.pid = con, os.getpid()
+        return con
+
+    def get(self, clave):
+        try:
+            with self._conexion() as con:
+                fila = con.execute("SELECT datos, meta FROM entradas WHERE clave = ?", (clave,)).fetchone()
+                if fila is None:
+                    return None
+                con.execute("UPDATE entradas SET usado = ? WHERE clave = ?", (time.time(), clave))
+            return fila[0], json.loads(fila[1]) if fila[1] else None
+        except sqlite3.Error:
+            return None
+
+    def put(self, clave, tipo, datos, meta=None):
+        try:
+            with self._conexion() as con:
+                con.execute("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?)",
+                            (clave, tipo, sqlite3.Binary(datos), json.dumps(meta) if meta is not None else None,
+                             len(datos), time.time()))
+                self._podar(con)
+        except sqlite3.Error:
+            pass
+
+    def _podar(self, con):
+        filas, total = con.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM entradas").fetchone()
+        if filas <= self.max_filas and total <= self.max_bytes:
+            return
+        # Se libera hasta el 90% de cada límite para no podar en cada inserción
+        sobran_filas = filas - int(self.max_filas * 0.9)
+        sobran_bytes = total - int(self.max_bytes * 0.9)
+        borrar = []
+        for clave, tamano in con.execute("SELECT clave, tamano FROM entradas ORDER BY usado"):
+            if sobran_filas <= 0 and sobran_bytes <= 0:
+                break
+            borrar.append((clave,))
+            sobran_filas -= 1
+            sobran_bytes -= tamano
+        con.executemany("DELETE FROM entradas WHERE clave = ?", borrar)
+
+def abrir_almacen(ruta):
+    if not ruta:
+        return None
+    try:
+        return AlmacenResultados(ruta)
+    except sqlite3.Error as e:
+        app.logger.warning("Almacén persistente desactivado (%s): %s", ruta, e)
+        return None
+
+ALMACEN = abrir_almacen(ALMACEN_RUTA)
+
+def result_key(A, b, method, mode):
+    return artifact_key('resultado', list(A.shape), A, b, method, mode)
+
+def stored_result(clave):
+    guardado = ALMACEN.get(clave) if ALMACEN is not None else None
+    if guardado is None:
+        return None
+    datos, meta = guardado
+    x = np.frombuffer(datos, dtype=complex).copy()
+    seq_info = {"estrategia": meta["estrategia"], "x_sec": None} if meta.get("estrategia") else None
+    return x, seq_info
+
+def store_result(clave, A, b, x, seq_info=None):
+    if ALMACEN is None:
+        return
+    residuo = float(np.linalg.norm(A @ x - b) / max(np.linalg.norm(b), 1e-300))
+    meta = {"residuo": residuo, "n": int(x.shape[0]),
+            "estrategia": seq_info["estrategia"] if seq_info else None}
+    ALMACEN.put(clave, 'resultado', np.ascontiguousarray(x, dtype=complex).tobytes(), meta)
+
+def solve_cached(A, b, method, mode):
+    clave = result_key(A, b, method, mode)
+    guardado = stored_result(clave)
+    if guardado is not None:
+        return guardado
+    seq_info = None
+    if method == 'secuencias':
+        x, seq_info = solve_secuencias(A, b)
+    elif A.shape[0] >= PLAZO_POOL_MIN_N:
+        x = run_with_deadline(solve_system, A, b, method=method)
+    else:
+        x = solve_system(A, b, method=method)
+    store_result(clave, A, b, x, seq_info)
+    return x, seq_info
+
+# 10.3 Control de Admisión
+# Cada petición costosa declara un costo estimado en "unidades" (1 = resolución
+# pequeña interactiva) y entra solo si cabe en el presupuesto del worker. Las
+# peticiones pesadas (costo > ADMISION_LIGERA_MAX) no pueden ocupar más de
+# ADMISION_PESADA_MAX unidades en conjunto, así que siempre queda sitio para las
+# pequeñas. Si no hay lugar tras ADMISION_ESPERA_MAX segundos en cola (o la cola
+# está llena) se responde 429 con Retry-After.
+class Admision:
+    def __init__(self, capacidad, pesada_max, espera_max, cola_max):
+        self.capacidad = capacidad
+        self.pesada_max = pesada_max
+        self.espera_max = espera_max
+        self.cola_max = cola_max
+        self.cond = threading.Condition()
+        self.en_uso = 0.0
+        self.pesadas = 0.0
+        self.esperando = 0
+        self.seg_por_unidad = 0.05 # Promedio móvil del tiempo de servicio por unidad
+
+    def _cabe(self, costo):
+        if self.en_uso + costo > self.capacidad:
+            return False
+        return costo <= ADMISION_LIGERA_MAX or self.pesadas + costo <= self.pesada_max
+
+    def entrar(self, costo):
+        with self.cond:
+            if self._cabe(costo):
+                self._ocupar(costo)
+                return True
+            if self.esperando >= self.cola_max:
+                return False
+            self.esperando += 1
+            try:
+                if not self.cond.wait_for(lambda: self._cabe(costo), timeout=self.espera_max):
+                    return False
+                self._ocupar(costo)
+                return True
+            finally:
+                self.esperando -= 1
+
+    def _ocupar(self, costo):
+        self.en_uso += costo
+        if costo > ADMISION_LIGERA_MAX:
+            self.pesadas += costo
+
+    def salir(self, costo, segundos):
+        with self.cond:
+            self.en_uso -= costo
+            if costo > ADMISION_LIGERA_MAX:
+                self.pesadas -= costo
+            self.seg_por_unidad = 0.9 * self.seg_por_unidad + 0.1 * (segundos / costo)
+            self.cond.notify_all()
+
+    def retry_after(self):
+        return max(1, math.ceil(self.seg_por_unidad * self.en_uso))
+
+ADMISION = Admision(ADMISION_CAPACIDAD, ADMISION_PESADA_MAX, ADMISION_ESPERA_MAX, ADMISION_COLA_MAX)
+
+class ServidorOcupado(Exception):
+    def __init__(self):
+        super().__init__("Servidor ocupado, intente de nuevo en unos segundos")
+        self.reintentar = ADMISION.retry_after()
+
+def admission_cost(costo):
+    # Una petición mayor que el límite de pesadas igual puede correr, pero sola
+    return min(max(costo, 1.0), ADMISION.pesada_max)
+
+# Para trabajo que no es una vista entera (p. ej. cada resolución de un flujo en vivo)
+@contextlib.contextmanager
+def admitido(costo):
+    costo = admission_cost(costo)
+    if not ADMISION.entrar(costo):
+        raise ServidorOcupado()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ADMISION.salir(costo, time.perf_counter() - t0)
+
+def busy_response(e):
+    resp = jsonify({"error": str(e)})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(e.reintentar)
+    return resp
+
+def con_admision(estimar):
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            try:
+                costo = estimar(*args, **kwargs)
+            except Exception:
+                costo = 1.0 # La vista se encarga de responder al pedido mal formado
+            try:
+                with admitido(costo):
+                    return vista(*args, **kwargs)
+            except ServidorOcupado as e:
+                return busy_response(e)
+        return envoltura
+    return decorador
+
+def solve_cost(n, method):
+    if method == 'auto':
+        method = 'cramer' if n <= 4 else 'gauss'
+    # Cramer: n+1 determinantes densos; el resto, una factorización
+    flops = (n + 1) * n**3 if method == 'cramer' else n**3
+    return 1 + n * n / ADMISION_CELDAS_UNIDAD + flops / ADMISION_FLOPS_UNIDAD
+
+def pdf_cost(clave):
+    if clave is None or ARTEFACTOS.get(clave) is not None:
+        return 1.0
+    caso = CASOS.get(clave)
+    casos = len(caso["lote"]) if caso is not None and "lote" in caso else 1
+    return ADMISION_PDF_COSTO * casos
+
+# 10.4 Perfilado bajo Demanda
+# Con CIRCUITSOLVE_PERFIL_TOKEN definido, una petición que envíe ese token en la
+# cabecera X-Perfil (o en ?perfil=) se ejecuta bajo cProfile. El perfil se guarda
+# en PERFIL_DIR y la respuesta normal lleva X-Perfil-Url con el informe. Además,
+# una fracción PERFIL_MUESTREO del tráfico se perfila sin pedirlo. Los archivos
+# rotan: solo se conservan los PERFIL_MAX_ARCHIVOS más recientes.
+PERFIL_LOCK = threading.Lock() # cProfile admite un solo perfilador activo a la vez
+
+def _perfil_autorizado(token):
+    return bool(PERFIL_TOKEN) and token is not None and hmac.compare_digest(token, PERFIL_TOKEN)
+
+def _guardar_perfil(perfil, nombre):
+    os.makedirs(PERFIL_DIR, exist_ok=True)
+    perfil_id = f"{time.time_ns()}-{nombre}-{os.getpid()}"
+    perfil.dump_stats(os.path.join(PERFIL_DIR, perfil_id + '.prof'))
+    archivos = sorted(f for f in os.listdir(PERFIL_DIR) if f.endswith('.prof'))
+    for viejo in archivos[:-PERFIL_MAX_ARCHIVOS]:
+        try:
+            os.unlink(os.path.join(PERFIL_DIR, viejo))
+        except OSError:
+            pass
+    return perfil_id
+
+def con_perfil(vista):
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        pedido = _perfil_autorizado(request.headers.get('X-Perfil') or request.args.get('perfil'))
+        if not pedido and not (PERFIL_MUESTREO > 0 and random.random() < PERFIL_MUESTREO):
+            return vista(*args, **kwargs)
+        if not PERFIL_LOCK.acquire(blocking=False):
+            return vista(*args, **kwargs) # Ya hay otro perfil en curso
+        try:
+            perfil = cProfile.Profile()
+            resp = app.make_response(perfil.runcall(vista, *args, **kwargs))
+            perfil_id = _guardar_perfil(perfil, vista.__name__)
+        finally:
+            PERFIL_LOCK.release()
+        if pedido:
+            resp.headers['X-Perfil-Id'] = perfil_id
+            resp.headers['X-Perfil-Url'] = f"/perfil/{perfil_id}"
+        return resp
+    return envoltura
+
+def profile_report(perfil_id, limite=40):
+    salida = io.StringIO()
+    stats = pstats.Stats(os.path.join(PERFIL_DIR, perfil_id + '.prof'), stream=salida)
+    stats.strip_dirs().sort_stats('cumulative')
+    stats.print_stats(limite)
+    # Árbol de llamadas: a quién llama cada una de las funciones más costosas
+    stats.print_callees(limite // 4)
+    return salida.getvalue()
+
+# 10.5 Resolución en Vivo (Server-Sent Events)
+# El editor abre un flujo SSE por sesión y envía cada edición con un POST corto.
+# Las ediciones se acumulan en el canal (una matriz completa reemplaza todo; las
+# celdas sueltas se fusionan) y el flujo espera VIVO_DEBOUNCE s sin cambios antes
+# de resolver. Cada edición incrementa la generación: si llega otra mientras se
+# resuelve, se cancela el plazo de esa resolución (los check_deadline() del parseo
+# y de la solución la cortan) y sus ediciones vuelven a la cola junto con la nueva.
+# Si ya había terminado, el resultado viejo se descarta antes de dibujar y de enviarse.
+# SESIONES y los canales viven en cada proceso: con varios workers el proxy debe
+# fijar /live/<sid>/* (y /matrix/<sid>) al mismo worker según el sid (en nginx, un
+# "map" que extraiga el sid de la ruta y "hash $sid consistent;" en el upstream,
+# con un worker por upstream: --workers 1 en cada instancia). Si una edición
+# llega a un worker sin flujo abierto para la sesión se responde 409 y el editor
+# vuelve al modo normal, en lugar de aceptarla y no entregar nunca el resultado.
+class CanalVivo:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.generacion = 0
+        self.atendida = 0
+        self.ultima_edicion = 0.0
+        self.completa = None # {"matrix", "vector"} pendiente
+        self.celdas = {} # (i, j) -> texto
+        self.fuentes = {} # i -> texto
+        self.method = 'auto'
+        self.mode = 'mallas'
+        self.flujos = 0 # Flujos SSE abiertos en este worker (bajo CANALES_LOCK)
+        self.en_curso = None # Plazo de la resolución en marcha; una edición nueva la cancela
+
+    def _fusionar(self, celdas, fuentes):
+        for i, j, valor in celdas:
+            A = self.completa["matrix"] if self.completa else None
+            if A is not None and 0 <= i < len(A) and 0 <= j < len(A[i]):
+                A[i][j] = valor
+            else:
+                self.celdas[(i, j)] = valor
+        for i, valor in fuentes:
+            b = self.completa["vector"] if self.completa else None
+            if b is not None and 0 <= i < len(b):
+                b[i] = valor
+            else:
+                self.fuentes[i] = valor
+
+    def editar(self, data, celdas, fuentes):
+        with self.cond:
+            if data.get('matrix') is not None:
+                self.completa = {"matrix": [list(row) for row in data['matrix']], "vector": list(data.get('vector') or [])}
+                self.celdas, self.fuentes = {}, {}
+            self._fusionar(celdas, fuentes)
+            self.method = data.get('method', self.method)
+            self.mode = data.get('mode', self.mode)
+            self.generacion += 1
+            self.ultima_edicion = time.monotonic()
+            if self.en_curso is not None:
+                self.en_curso.cancelado.set() # Su resultado ya no se va a enviar
+                self.en_curso = None
+            self.cond.notify_all()
+            return self.generacion
+
+    def iniciar(self, generacion, plazo):
+        with self.cond:
+            if generacion != self.generacion:
+                return False
+            self.en_curso = plazo
+            return True
+
+    def devolver(self, completa, celdas, fuentes):
+        # Ediciones de una resolución cancelada (no llegaron a la sesión): vuelven a
+        # la cola por debajo de las más nuevas, que se envían con la próxima generación
+        with self.cond:
+            if self.completa is not None:
+                return # Una matriz completa más nueva ya reemplaza todo
+            nuevas_celdas, nuevas_fuentes = list(self.celdas.items()), list(self.fuentes.items())
+            self.completa, self.celdas, self.fuentes = completa, {}, {}
+            self._fusionar([(i, j, v) for (i, j), v in celdas], fuentes)
+            self._fusionar([(i, j, v) for (i, j), v in nuevas_celdas], nuevas_fuentes)
+            if self.atendida == self.generacion:
+                # Otro flujo de la sesión ya tomó la edición nueva: hace falta otra vuelta
+                self.generacion += 1
+                self.cond.notify_all()
+
+    def tomar(self, timeout):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.generacion > self.atendida, timeout=timeout):
+                return None
+            # Debounce: se espera una pausa en las ediciones, sin pasar de VIVO_DEBOUNCE_MAX
+            limite = time.monotonic() + VIVO_DEBOUNCE_MAX
+            while True:
+                ahora = time.monotonic()
+                espera = min(self.ultima_edicion + VIVO_DEBOUNCE, limite) - ahora
+                if espera <= 0:
+                    break
+                self.cond.wait(espera)
+            trabajo = (self.generacion, self.completa, list(self.celdas.items()), list(self.fuentes.items()),
+                       self.method, self.mode)
+            self.completa, self.celdas, self.fuentes = None, {}, {}
+            self.atendida = self.generacion
+            return trabajo
+
+    def vigente(self, generacion):
+        return self.generacion == generacion
+
+CANALES_LOCK = threading.Lock()
+VIVO_STREAMS = {"activos": 0}
+
+def _sse(evento, datos, generacion=None):
+    cabecera = f"event: {evento}\n" + (f"id: {generacion}\n" if generacion is not None else "")
+    return cabecera + f"data: {app.json.dumps(datos)}\n\n"
+
+def live_events(sesion, canal):
+    inactivo_desde = time.monotonic()
+    yield f"retry: {VIVO_REINTENTO_MS}\n\n"
+    while True:
+        trabajo = canal.tomar(VIVO_KEEPALIVE)
+        if trabajo is None:
+            if time.monotonic() - inactivo_desde > VIVO_INACTIVIDAD:
+                return # EventSource vuelve a conectarse solo tras VIVO_REINTENTO_MS
+            yield ": keepalive\n\n"
+            continue
+        inactivo_desde = time.monotonic()
+        generacion, completa, celdas, fuentes, method, mode = trabajo
+        n = len(completa["matrix"]) if completa is not None else len(sesion.A_strings or [])
+        plazo = Plazo()
+        try:
+            with admitido(solve_cost(n, method)), sesion.lock, plazo.en('solucion'):
+                if not canal.iniciar(generacion, plazo):
+                    plazo.cancelado.set() # Llegó otra edición mientras se esperaba turno
+                    check_deadline()
+                if completa is not None:
+                    res = solve_en_sesion(sesion, method, A_strings=completa["matrix"], b_strings=completa["vector"],
+                                          mode=mode)
+                    if celdas or fuentes:
+                        res = solve_en_sesion(sesion, method, celdas=[(i, j, v) for (i, j), v in celdas],
+                                              fuentes=fuentes, mode=mode)
+                else:
+                    res = solve_en_sesion(sesion, method, celdas=[(i, j, v) for (i, j), v in celdas], fuentes=fuentes,
+                                          mode=mode)
+        except ServidorOcupado as e:
+            yield _sse('error', {"error": str(e), "codigo": 429, "reintentar": e.reintentar,
+                                 "generacion": generacion}, generacion)
+            continue
+        except PlazoVencido as e:
+            if plazo.cancelado.is_set() and not canal.vigente(generacion):
+                canal.devolver(completa, celdas, fuentes) # Reemplazada: se resuelve con la siguiente
+            else:
+                yield _sse('error', {"error": str(e), "codigo": 504, "generacion": generacion}, generacion)
+            continue
+        except LookupError as e:
+            yield _sse('error', {"error": str(e), "codigo": 409, "generacion": generacion}, generacion)
+            continue
+        except Exception as e:
+            yield _sse('error', {"error": str(e), "codigo": 400, "generacion": generacion}, generacion)
+            continue
+        if not canal.vigente(generacion):
+            continue # Ya hay una edición más nueva: no se dibuja ni se envía
+        A_strings, b_strings, A, b, x, actualizacion, seq_info = res
+        datos = build_solve_response(A_strings, b_strings, A, b, x, mode, seq_info, actualizacion)
+        png = get_fasor_png(datos["fasor_url"][len("/fasor/"):-len(".png")])
+        if not canal.vigente(generacion):
+            continue
+        datos["fasor_png"] = "data:image/png;base64," + base64.b64encode(bytes(png)).decode('ascii')
+        datos["generacion"] = generacion
+        yield _sse('resultado', datos, generacion)
+
+# 10.6 Respuestas Numéricas (Negociación por Accept)
+# Para clientes programáticos (barridos, lotes), /solve y /kron/<id>/solve devuelven
+# la solución sin formatear según la cabecera Accept:
+#   application/json                            respuesta normal (texto, verificación, URLs)
+#   application/vnd.circuitsolve.numerico+json  {"real": [...], "imag": [...]}
+#   application/x-npy                           arreglo .npy (numpy.load)
+#   application/octet-stream                    float64 little-endian, sin encabezado
+# Con ?forma=polar los pares son magnitud y ángulo (grados) en lugar de real e imag.
+# En binario cada valor ocupa dos columnas (forma (..., 2), en X-Forma). Estas
+# respuestas no registran fasor ni PDF (no hay URLs que seguir) y el JSON se
+# serializa con orjson, directo desde los arreglos, si está instalado.
+TIPO_NUMERICO_JSON = 'application/vnd.circuitsolve.numerico+json'
+TIPOS_RESPUESTA = ('application/json', TIPO_NUMERICO_JSON, 'application/x-npy', 'application/octet-stream')
+FORMAS_NUMERICAS = {'rect': ('real', 'imag'), 'polar': ('mag', 'angle')}
+
+def response_type():
+    if not request.accept_mimetypes:
+        return 'application/json'
+    return request.accept_mimetypes.best_match(TIPOS_RESPUESTA, default='application/json')
+
+def response_shape():
+    forma = request.args.get('forma', 'rect')
+    if forma not in FORMAS_NUMERICAS:
+        raise ValueError(f"forma '{forma}' desconocida (use {', '.join(FORMAS_NUMERICAS)})")
+    return forma
+
+def numeric_response(X, tipo, forma='rect', extra=None):
+    X = np.asarray(X, dtype=complex)
+    nombres = FORMAS_NUMERICAS[forma]
+    pares = (np.abs(X), np.degrees(np.angle(X))) if forma == 'polar' else \
+        (np.ascontiguousarray(X.real), np.ascontiguousarray(X.imag)) # orjson exige arreglos contiguos
+    if tipo == TIPO_NUMERICO_JSON:
+        datos = dict(extra or {}, **dict(zip(nombres, pares)))
+        if orjson is not None:
+            cuerpo = orjson.dumps(datos, option=orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            cuerpo = json.dumps({k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in datos.items()},
+                                separators=(',', ':'))
+        return app.response_class(cuerpo, mimetype=tipo)
+    datos = np.ascontiguousarray(np.stack(pares, axis=-1), dtype='<f8')
+    if tipo == 'application/x-npy':
+        buf = io.BytesIO()
+        np.save(buf, datos, allow_pickle=False)
+        cuerpo = buf.getvalue()
+    else:
+        cuerpo = datos.tobytes()
+    resp = app.response_class(cuerpo, mimetype=tipo)
+    resp.headers['X-Forma'] = ','.join(map(str, datos.shape))
+    resp.headers['X-Columnas'] = ','.join(nombres)
+    return resp
+
 # 11. Endpoints (Rutas) de la API de Flask
-LAST = {"A_strings": None, "b_strings": None, "x": None, "fasor_bytes": None, "A_numpy": None, "b_numpy": None, "mode": "mallas"}
+# Solo claves: los datos del caso viven en CASOS/ARTEFACTOS con su presupuesto de RAM
+LAST = {"fasor_key": None, "pdf_key": None, "mode": "mallas"}
+
+# La plantilla solo depende de constantes: se renderiza una vez al arrancar
+INDEX_PAGE = build_static_asset(
+    app.jinja_env.from_string(HTML_TEMPLATE).render(max_size=MAX_SIZE, default_size=DEFAULT_SIZE), 'text/html')
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, max_size=MAX_SIZE, default_size=DEFAULT_SIZE)
+    return send_static_asset(INDEX_PAGE, "no-cache")
+
+@app.route('/vendor/<path:nombre>')
+def vendor_route(nombre):
+    asset = VENDOR_ASSETS.get(nombre)
+    if asset is None:
+        return "Recurso no encontrado", 404
+    return send_static_asset(asset, VENDOR_CACHE_CONTROL)
 
 @app.route('/example/<tipo>')
 def example_route(tipo):
     try:
         n = int(request.args.get('n', DEFAULT_SIZE))
+        formato = request.args.get('formato', 'texto')
+        if formato == 'numerico':
+            # Arreglos sin formatear: real/imag densos o tripletas COO con sparse=1
+            if n < 1 or n > MAX_SIZE_NUMERICO:
+                return jsonify({"error":"Tamaño n inválido"}), 400
+            if tipo not in GENERADORES:
+                return jsonify({"error":"Tipo de ejemplo desconocido"}), 404
+            sparse = request.args.get('sparse', '0') in ('1', 'true')
+            A, b, desc = GENERADORES[tipo](n, sparse=sparse)
+            vector = {"real": b.real.tolist(), "imag": b.imag.tolist()}
+            if sparse:
+                filas, cols, vals, forma = A
+                matrix = {"filas": filas.tolist(), "cols": cols.tolist(), "real": vals.real.tolist(),
+                          "imag": vals.imag.tolist(), "n": forma[0]}
+            else:
+                matrix = {"real": A.real.tolist(), "imag": A.imag.tolist()}
+            return jsonify({"matrix": matrix, "vector": vector, "desc": desc})
         if n < 1 or n > MAX_SIZE:
             return jsonify({"error":"Tamaño n inválido"}), 400
         if tipo == 'rlc': A,b,desc = example_rlc_series(n)
         elif tipo == 'ac': A,b,desc = example_ac(n)
         elif tipo == 'trif': A,b,desc = example_trifasico()
+        elif tipo in GENERADORES:
+            An, bn, desc = GENERADORES[tipo](n)
+            if An.shape[0] > MAX_SIZE:
+                return jsonify({"error":"Tamaño n inválido"}), 400
+            A = [[format_cell(z) for z in row] for row in An]
+            b = [format_cell(z) for z in bn]
         else: return jsonify({"error":"Tipo de ejemplo desconocido"}), 404
         return jsonify({"matrix": A, "vector": b, "desc": desc})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-
  ### FASE 3.7 - MODIFICADO ### Precisión 4 decimales ***/
+def build_solve_response(A_strings, b_strings, A, b, x, mode, seq_info=None, actualizacion=None):
+    pretty_results = [pretty_complex(xi, precision=4) for xi in x] # Precisión de 4 decimales
+    
+    Vcalc = (A @ x).tolist()
+    
+    # Crear lista estructurada para la verificación
+    Vcalc_pretty = [pretty_complex(v, precision=4) for v in Vcalc]
+    
+    # El fasor y el PDF se generan cuando el navegador pide sus URLs
+    fasor_key, pdf_key = register_case(A_strings, b_strings, A, b, x, mode)
+    
+    LAST['fasor_key'] = fasor_key
+    LAST['pdf_key'] = pdf_key
+    LAST['mode'] = mode
+    
+    response = {"result": pretty_results, "vcalc": Vcalc_pretty,
+                "fasor_url": f"/fasor/{fasor_key}.png", "pdf_url": f"/reporte/{pdf_key}.pdf"}
+    if actualizacion is not None:
+        response["actualizacion"] = actualizacion
+    if seq_info is not None:
+        x_sec = seq_info["x_sec"]
+        if x_sec is None:
+            x_sec = phase_to_sequence(x.reshape(-1, 3))
+        response["estrategia"] = seq_info["estrategia"]
+        response["secuencias"] = [
+            {nombre: pretty_complex(x_sec[k, s], precision=4) for s, nombre in enumerate(SECUENCIAS)}
+            for k in range(x_sec.shape[0])
+        ]
+    return response
+
+def _solve_request_cost():
+    data = request.get_json(silent=True) or {}
+    return solve_cost(len(data.get('matrix') or []), data.get('method', 'auto'))
+
+def _session_size(sid):
+    # Sin crear la sesión: si no existe, la vista responde el error
+    with SESIONES_LOCK:
+        sesion = SESIONES.get(sid)
+    return len(sesion.A_strings) if sesion is not None and sesion.A_strings is not None else 0
+
+def _matrix_request_cost(sid):
+    data = request.get_json(silent=True) or {}
+    n = len(data['matrix']) if data.get('matrix') is not None else _session_size(sid)
+    return solve_cost(n, data.get('method', 'auto'))
+
+def _live_edit_cost(sid):
+    # La edición solo se parsea y se encola; la resolución se admite en el flujo
+    data = request.get_json(silent=True) or {}
+    celdas = sum(len(fila) for fila in data.get('matrix') or []) + len(data.get('cells') or [])
+    return 1 + celdas / ADMISION_CELDAS_UNIDAD
+
+def _batch_request_cost():
+    data = request.get_json(silent=True) or {}
+    return sum(solve_cost(len(c.get('matrix') or []), c.get('method', 'auto'))
+               for c in (data.get('casos') or [])[:MAX_CASOS_LOTE] if not c.get('clave'))
+
+def _tolerances_request_cost():
+    data = request.get_json(silent=True) or {}
+    n = len(data.get('matrix') or [])
+    muestras = min(max(int(data.get('muestras', 1000)), 1), MAX_MUESTRAS)
+    return solve_cost(n, 'gauss') + muestras * n**3 / ADMISION_FLOPS_UNIDAD
+
+def _harmonics_request_cost():
+    data = request.get_json(silent=True) or {}
+    espectro = (data.get('espectro') or [])[:MAX_ARMONICOS]
+    n = len(espectro[0].get('vector') or []) if espectro else 0
+    return 1 + len(espectro) * (n * n / ADMISION_CELDAS_UNIDAD + n**3 / ADMISION_FLOPS_UNIDAD)
+
+def _sensitivity_request_cost():
+    data = request.get_json(silent=True) or {}
+    n = len(data.get('matrix') or [])
+    k = min(len(data['salidas']), n) if data.get('salidas') is not None else n
+    # Una factorización y k·n² celdas de dx/dA formateadas en la respuesta
+    return solve_cost(n, 'gauss') + k * n * n / ADMISION_CELDAS_UNIDAD
+
+def _thevenin_request_cost():
+    data = request.get_json(silent=True) or {}
+    n = len(data.get('matrix') or [])
+    k = len(data.get('puertos') or [])
+    return solve_cost(n, 'gauss') + k * n * n / ADMISION_FLOPS_UNIDAD
+
+def _components_request_cost():
+    data = request.get_json(silent=True) or {}
+    frecuencias = data.get('frecuencias', 60)
+    f = len(frecuencias) if isinstance(frecuencias, list) else 1
+    return 1 + min(len(data.get('valores') or []) * f, MAX_COMPONENTES) / ADMISION_CELDAS_UNIDAD
+
+def transient_cost(n, elementos, pasos, cambios):
+    # Una factorización por estado de los interruptores y un paso de estado por muestra
+    return 1 + ((1 + cambios) * n**3 + pasos * (n + elementos)**2) / ADMISION_FLOPS_UNIDAD
+
 @app.route('/solve', methods=['POST'])
+@con_admision(_solve_request_cost)
+@con_perfil
 def solve_route():
     try:
         data = request.get_json()
@@ -1324,76 +3598,795 @@ def solve_route():
         method = data.get('method', 'auto')
         mode = data.get('mode', 'mallas')
         
-        A, b = validate_and_build_A_b(A_strings, b_strings)
-        x = solve_system(A, b, method=method)
-        
-        pretty_results = []
-        for xi in x:
-            rect = format_rect(xi, precision=4) # Precisión de 4 decimales
-            mag, ang = rect_to_polar(xi)
-            pretty_results.append({"rect": rect, "mag": mag, "angle": ang})
-        
-        Vcalc = (A @ x).tolist()
-        
-        # Crear lista estructurada para la verificación
-        Vcalc_pretty = []
-        for v in Vcalc:
-            rect = format_rect(v, precision=4) # Precisión de 4 decimales
-            mag, ang = rect_to_polar(v)
-            Vcalc_pretty.append({"rect": rect, "mag": mag, "angle": ang})
-        
-        fasor_buf = make_fasor_png(x, mode=mode)
+        tipo = response_type()
+        forma = response_shape()
+        session_id = data.get('session')
+        seq_info = None
+        actualizacion = None
+        plazo = Plazo()
+        if session_id:
+            sesion = get_sesion(session_id)
+            with sesion.lock, plazo.en('solucion'):
+                A_strings, b_strings, A, b, x, actualizacion, seq_info = solve_en_sesion(
+                    sesion, method, A_strings=A_strings, b_strings=b_strings, mode=mode)
+        else:
+            with plazo.en('parseo'):
+                A, b = validate_and_build_A_b(A_strings, b_strings)
+            with plazo.en('solucion'):
+                x, seq_info = solve_cached(A, b, method, mode)
         
-        LAST['A_strings'] = A_strings
-        LAST['b_strings'] = b_strings
-        LAST['x'] = x
-        LAST['fasor_bytes'] = fasor_buf.getvalue()
-        LAST['A_numpy'] = A
-        LAST['b_numpy'] = b
-        LAST['mode'] = mode
-        
-        return jsonify({"result": pretty_results, "vcalc": Vcalc_pretty})
+        if tipo != 'application/json':
+            return numeric_response(x, tipo, forma)
+        return jsonify(build_solve_response(A_strings, b_strings, A, b, x, mode, seq_info, actualizacion))
     
+    except PlazoVencido as e:
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Recurso de matriz por sesión: PUT envía la matriz completa y PATCH solo las
+# celdas editadas ({"cells": [{"i", "j", "value"}], "vector": [{"i", "value"}]},
+# índices desde 0 como en los campos A_i_j / b_i del formulario).
+@app.route('/matrix/<sid>', methods=['PUT', 'PATCH'])
+@con_admision(_matrix_request_cost)
+@con_perfil
+def matrix_route(sid):
+    try:
+        data = request.get_json()
+        method = data.get('method', 'auto')
+        mode = data.get('mode', 'mallas')
+        sesion = get_sesion(sid)
+        # Parseo y resolución van juntos en la sesión (como en /solve con "session")
+        with sesion.lock, Plazo().en('solucion'):
+            if request.method == 'PUT':
+                res = solve_en_sesion(sesion, method, A_strings=data.get('matrix'), b_strings=data.get('vector'),
+                                      mode=mode)
+            else:
+                try:
+                    celdas = [(int(c['i']), int(c['j']), str(c['value'])) for c in data.get('cells', [])]
+                    fuentes = [(int(c['i']), str(c['value'])) for c in data.get('vector', [])]
+                except Exception:
+                    raise ValueError("Formato de parche inválido")
+                res = solve_en_sesion(sesion, method, celdas=celdas, fuentes=fuentes, mode=mode)
+        A_strings, b_strings, A, b, x, actualizacion, seq_info = res
+        return jsonify(build_solve_response(A_strings, b_strings, A, b, x, mode, seq_info, actualizacion))
+    except PlazoVencido as e:
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Modo en vivo: GET abre el flujo SSE de la sesión; POST envía ediciones con el
+# mismo formato que PUT (matriz completa) o PATCH (celdas) de /matrix/<sid>.
+@app.route('/live/<sid>/stream')
+def live_stream_route(sid):
+    try:
+        sesion = get_sesion(sid)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with CANALES_LOCK:
+        if VIVO_STREAMS["activos"] >= VIVO_MAX_STREAMS:
+            resp = jsonify({"error": "Demasiadas conexiones en vivo; use Resolver"})
+            resp.status_code = 503
+            resp.headers['Retry-After'] = str(VIVO_KEEPALIVE)
+            return resp
+        VIVO_STREAMS["activos"] += 1
+        if sesion.canal is None:
+            sesion.canal = CanalVivo()
+        canal = sesion.canal
+        canal.flujos += 1
+
+    def flujo():
+        try:
+            yield from live_events(sesion, canal)
+        finally:
+            with CANALES_LOCK:
+                VIVO_STREAMS["activos"] -= 1
+                canal.flujos -= 1
+
+    resp = app.response_class(flujo(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no' # Sin buffer en nginx
+    return resp
+
+@app.route('/live/<sid>/edit', methods=['POST'])
+@con_admision(_live_edit_cost)
+def live_edit_route(sid):
+    try:
+        data = request.get_json()
+        sesion = get_sesion(sid)
+        try:
+            celdas = [(int(c['i']), int(c['j']), str(c['value'])) for c in data.get('cells', [])]
+            fuentes = [(int(c['i']), str(c['value'])) for c in data.get('vector', [])] if data.get('matrix') is None else []
+        except Exception:
+            raise ValueError("Formato de edición inválido")
+        with CANALES_LOCK:
+            canal = sesion.canal if sesion.canal is not None and sesion.canal.flujos > 0 else None
+        if canal is None:
+            # El flujo está en otro worker (sin enrutamiento fijo) o ya se cerró
+            return jsonify({"error": "No hay flujo en vivo abierto para esta sesión en este servidor"}), 409
+        generacion = canal.editar(data, celdas, fuentes)
+        return jsonify({"generacion": generacion}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# Rutas heredadas: siempre el último caso, revalidadas con ETag
 @app.route('/fasor.png')
+@con_perfil
 def fasor_png():
     mode = LAST.get('mode', 'mallas')
-    if LAST.get('fasor_bytes') is None:
-        buf = make_fasor_png(np.array([]), mode=mode)
-        return send_file(buf, mimetype='image/png')
-    else:
-        return send_file(io.BytesIO(LAST['fasor_bytes']), mimetype='image/png')
+    clave = LAST.get('fasor_key')
+    try:
+        with Plazo().en('dibujo'):
+            data = get_fasor_png(clave) if clave else None
+    except PlazoVencido as e:
+        return str(e), 504
+    if data is None:
+        clave = artifact_key('png-vacio', mode)
+        if request.if_none_match.contains(clave):
+            return not_modified(clave, inmutable=False)
+        data = ARTEFACTOS.get(clave)
+        if data is None:
+            data = make_fasor_png(np.array([]), mode=mode).getvalue()
+            ARTEFACTOS.put(clave, data)
+    return send_artifact(data, clave, 'image/png', inmutable=False)
 
 @app.route('/download_pdf')
+@con_admision(lambda: pdf_cost(LAST.get('pdf_key')))
+@con_perfil
 def download_pdf():
-    if LAST.get('x') is None:
+    if LAST.get('pdf_key') is None:
         return "No hay solución para exportar. Resuelve primero.", 400
     try:
-        pdf_bytes_io = create_pdf_bytes(
-            LAST['A_strings'], 
-            LAST['b_strings'], 
-            LAST['x'], 
-            io.BytesIO(LAST['fasor_bytes']) if LAST['fasor_bytes'] else None,
-            LAST['A_numpy'],
-            LAST['b_numpy'],
-            LAST.get('mode', 'mallas')
-        )
-        return send_file(
-            pdf_bytes_io, 
-            mimetype='application/pdf', 
-            as_attachment=True, 
-            download_name='CircuitSolve_Reporte.pdf'
-        )
+        clave = LAST['pdf_key']
+        if request.if_none_match.contains(clave):
+            return not_modified(clave, inmutable=False)
+        with Plazo().en('pdf'):
+            data = get_pdf(clave)
+        if data is None:
+            return "El reporte ya no está disponible. Resuelve de nuevo.", 404
+        return send_artifact(data, clave, 'application/pdf', inmutable=False,
+                             download_name='CircuitSolve_Reporte.pdf')
+    except PlazoVencido as e:
+        return str(e), 504
     except Exception as e:
         return f"Error generando PDF: {e}", 500
 
+# Reporte combinado: {"titulo", "casos": [{"clave"} | {"matrix", "vector", "method", "mode"}, ...]}
+# "clave" es la de un pdf_url ya devuelto por /solve. Responde con la URL del PDF,
+# que se genera (una sola vez) cuando se pide.
+@app.route('/reporte/lote', methods=['POST'])
+@con_admision(_batch_request_cost)
+def reporte_lote_route():
+    try:
+        data = request.get_json()
+        titulo = str(data.get('titulo') or PDF_TITLE)
+        entradas = data.get('casos') or []
+        if not entradas:
+            return jsonify({"error": "No hay casos"}), 400
+        if len(entradas) > MAX_CASOS_LOTE:
+            return jsonify({"error": f"Máximo {MAX_CASOS_LOTE} casos por reporte"}), 400
+        casos, claves = [], []
+        plazo = Plazo()
+        for k, entrada in enumerate(entradas):
+            if entrada.get('clave'):
+                caso = CASOS.get(entrada['clave'])
+                if caso is None or "A_strings" not in caso:
+                    return jsonify({"error": f"Caso {k+1}: ya no está disponible. Resuélvalo de nuevo."}), 404
+                clave = entrada['clave']
+            else:
+                try:
+                    A_strings, b_strings = entrada.get('matrix'), entrada.get('vector')
+                    mode = entrada.get('mode', 'mallas')
+                    with plazo.en('parseo'):
+                        A, b = validate_and_build_A_b(A_strings, b_strings)
+                    with plazo.en('solucion'):
+                        x, _ = solve_cached(A, b, entrada.get('method', 'auto'), mode)
+                except PlazoVencido as e:
+                    return jsonify({"error": f"Caso {k+1}: {e}", "etapa": e.etapa}), 504
+                except Exception as e:
+                    return jsonify({"error": f"Caso {k+1}: {e}"}), 400
+                _, clave = register_case(A_strings, b_strings, A, b, x, mode)
+                caso = {"A_strings": A_strings, "b_strings": b_strings, "x": x, "A_numpy": A, "b_numpy": b, "mode": mode}
+            casos.append(dict(caso, titulo=entrada.get('titulo')))
+            claves.append([clave, entrada.get('titulo')])
+        clave = artifact_key('pdf-lote', titulo, claves)
+        CASOS.put(clave, {"lote": casos, "titulo": titulo})
+        return jsonify({"casos": len(casos), "pdf_url": f"/reporte/{clave}.pdf"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Informe de un perfil guardado: texto (pstats) o ?formato=prof para el archivo
+# original (snakeviz, flameprof, etc.). Requiere el mismo token que el perfilado.
+@app.route('/perfil/<perfil_id>')
+def perfil_route(perfil_id):
+    if not _perfil_autorizado(request.headers.get('X-Perfil') or request.args.get('perfil')):
+        return "No autorizado", 403
+    if not all(ch.isalnum() or ch in '-_' for ch in perfil_id):
+        return "Perfil no encontrado", 404
+    ruta = os.path.join(PERFIL_DIR, perfil_id + '.prof')
+    if not os.path.exists(ruta):
+        return "Perfil no encontrado", 404
+    if request.args.get('formato') == 'prof':
+        return send_file(ruta, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=perfil_id + '.prof')
+    return app.response_class(profile_report(perfil_id), mimetype='text/plain')
+
+# Conversión por lotes: {"tipos": [...], "valores": [...], "prefijos": [...] | "m",
+# "frecuencias": [...], "unidad": "hz" | "rad", "serie": bool, "formato": "texto" | "numerico"}
+# Devuelve Z y Y con forma (frecuencias, componentes); con "serie" también la suma
+# de todos los componentes en serie para cada frecuencia.
+@app.route('/componentes', methods=['POST'])
+@con_admision(_components_request_cost)
+def componentes_route():
+    try:
+        data = request.get_json()
+        valores = data.get('valores') or []
+        tipos = data.get('tipos')
+        if isinstance(tipos, str):
+            tipos = [tipos] * len(valores)
+        prefijos = data.get('prefijos', '')
+        if isinstance(prefijos, str):
+            prefijos = [prefijos] * len(valores)
+        if not valores or len(tipos or []) != len(valores) or len(prefijos) != len(valores):
+            return jsonify({"error": "tipos, valores y prefijos deben tener el mismo tamaño"}), 400
+        frecuencias = data.get('frecuencias', 60)
+        if not isinstance(frecuencias, list):
+            frecuencias = [frecuencias]
+        if len(valores) * len(frecuencias) > MAX_COMPONENTES:
+            return jsonify({"error": f"Máximo {MAX_COMPONENTES} conversiones por petición"}), 400
+        convertidos = []
+        for k, (t, v, p) in enumerate(zip(tipos, valores, prefijos)):
+            try:
+                convertidos.append(parse_component(t, v, p))
+            except Exception as e:
+                return jsonify({"error": f"Error en componente {k+1}: {e}"}), 400
+        tipos = [t for t, _ in convertidos]
+        valores = [v for _, v in convertidos]
+        try:
+            f = np.array([parse_complex(v).real for v in frecuencias], dtype=float)
+        except Exception as e:
+            return jsonify({"error": f"Error en frecuencias: {e}"}), 400
+        if np.any(f <= 0):
+            return jsonify({"error": "Las frecuencias deben ser positivas"}), 400
+        omegas = f if data.get('unidad', 'hz') == 'rad' else 2 * math.pi * f
+        Z = component_impedances(tipos, valores, omegas)
+        resultado = {"z": Z, "y": component_admittances(Z)}
+        if data.get('serie'):
+            resultado["z_serie"] = Z.sum(axis=1)
+            resultado["y_serie"] = component_admittances(resultado["z_serie"])
+        if data.get('formato', 'texto') == 'numerico':
+            # Valores infinitos (cortocircuito/circuito abierto) se envían como null
+            salida = {nombre: {"real": np.where(np.isfinite(M), M.real, None).tolist(),
+                               "imag": np.where(np.isfinite(M), M.imag, None).tolist()}
+                      for nombre, M in resultado.items()}
+        else:
+            celda = np.vectorize(lambda z: format_cell(z) if cmath.isfinite(z) else None, otypes=[object])
+            salida = {nombre: celda(M).tolist() for nombre, M in resultado.items()}
+        salida["tipos"] = tipos
+        salida["omegas"] = omegas.tolist()
+        return jsonify(salida)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Rutas por hash de contenido: inmutables, cacheables por navegador y proxy
+@app.route('/fasor/<clave>.png')
+@con_perfil
+def fasor_hash_route(clave):
+    if request.if_none_match.contains(clave):
+        return not_modified(clave, inmutable=True)
+    try:
+        with Plazo().en('dibujo'):
+            data = get_fasor_png(clave)
+    except PlazoVencido as e:
+        return str(e), 504
+    if data is None:
+        return "Fasor no disponible. Resuelve de nuevo.", 404
+    return send_artifact(data, clave, 'image/png', inmutable=True)
+
+@app.route('/reporte/<clave>.pdf')
+@con_admision(pdf_cost)
+@con_perfil
+def reporte_hash_route(clave):
+    if request.if_none_match.contains(clave):
+        return not_modified(clave, inmutable=True)
+    try:
+        with Plazo().en('pdf'):
+            data = get_pdf(clave)
+        if data is None:
+            return "El reporte ya no está disponible. Resuelve de nuevo.", 404
+        return send_artifact(data, clave, 'application/pdf', inmutable=True,
+                             download_name='CircuitSolve_Reporte.pdf')
+    except PlazoVencido as e:
+        return str(e), 504
+    except Exception as e:
+        return f"Error generando PDF: {e}", 500
+
+def _parse_tolerancia(valor, forma, nombre):
+    if valor is None:
+        return 0.0
+    try:
+        if isinstance(valor, (list, tuple)):
+            arr = np.vectorize(lambda v: parse_complex(v).real, otypes=[float])(np.array(valor, dtype=object))
+            if arr.shape != forma: raise ValueError("tamaño incorrecto")
+            return arr
+        return float(parse_complex(valor).real)
+    except Exception as e:
+        raise ValueError(f"Tolerancia de {nombre} inválida: {e}")
+
+def _parse_componentes(componentes, n):
+    parsed = []
+    for c, comp in enumerate(componentes or []):
+        try:
+            celdas = []
+            for celda in comp["celdas"]:
+                i, j = int(celda[0]), int(celda[1])
+                coef = float(celda[2]) if len(celda) > 2 else 1.0
+                if not (1 <= i <= n and 1 <= j <= n): raise ValueError(f"celda [{i},{j}] fuera de rango")
+                celdas.append((i-1, j-1, coef))
+            parsed.append({"valor": parse_complex(comp["valor"]), "tol": float(comp["tol"]), "celdas": celdas})
+        except Exception as e:
+            raise ValueError(f"Error en componente {c+1}: {e}")
+    return parsed
+
+@app.route('/tolerancias', methods=['POST'])
+@con_admision(_tolerances_request_cost)
+def tolerancias_route():
+    try:
+        data = request.get_json()
+        mode = data.get('mode', 'mallas')
+        plazo = Plazo()
+        with plazo.en('parseo'):
+            A, b = validate_and_build_A_b(data.get('matrix'), data.get('vector'))
+        n = A.shape[0]
+        with plazo.en('solucion'):
+            res = monte_carlo_tolerancias(
+                A, b,
+                tol_A=_parse_tolerancia(data.get('tolerancia'), (n, n), "A"),
+                tol_b=_parse_tolerancia(data.get('tolerancia_b'), (n,), "b"),
+                componentes=_parse_componentes(data.get('componentes'), n),
+                muestras=int(data.get('muestras', 1000)),
+                distribucion=data.get('distribucion', 'uniforme'),
+                semilla=data.get('semilla'),
+                bins=int(data.get('bins', MC_BINS)),
+            )
+        pref = "I" if mode == 'mallas' else "V"
+        estadisticas = []
+        for k, est in enumerate(res["estadisticas"]):
+            est = dict(est)
+            est["nombre"] = f"{pref}{k+1}"
+            est["media"] = pretty_complex(est["media"], precision=4)
+            estadisticas.append(est)
+        return jsonify({
+            "muestras": res["muestras"],
+            "parcial": res["parcial"],
+            "nominal": [pretty_complex(v, precision=4) for v in res["nominal"]],
+            "estadisticas": estadisticas,
+        })
+    except PlazoVencido as e:
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/sensibilidad', methods=['POST'])
+@con_admision(_sensitivity_request_cost)
+def sensibilidad_route():
+    try:
+        data = request.get_json()
+        mode = data.get('mode', 'mallas')
+        A, b = validate_and_build_A_b(data.get('matrix'), data.get('vector'))
+        n = A.shape[0]
+        salidas = data.get('salidas')
+        if salidas is None:
+            salidas = list(range(n))
+        else:
+            salidas = [int(k) - 1 for k in salidas]
+            if any(k < 0 or k >= n for k in salidas):
+                return jsonify({"error": "Índice de salida fuera de rango"}), 400
+        # dx/dA se envía completo (salidas x n² celdas formateadas)
+        if len(salidas) * n * n > MAX_SENSIBILIDADES:
+            return jsonify({"error": f"Salidas x n² excede el límite ({MAX_SENSIBILIDADES}); pida menos salidas o reduzca n"}), 400
+        top = int(data.get('top', 5))
+        x, dx_db, dx_dA = sensibilidades(A, b, salidas)
+        rankings = ranking_sensibilidades(A, b, x, dx_db, dx_dA, salidas, top=top,
+                                          orden=data.get('orden', 'relativa'))
+        pref = "I" if mode == 'mallas' else "V"
+        resultado = []
+        for fila, k in enumerate(salidas):
+            for item in rankings[fila]:
+                item["sens"] = pretty_complex(item["sens"], precision=6)
+            resultado.append({
+                "nombre": f"{pref}{k+1}",
+                "valor": pretty_complex(x[k], precision=4),
+                "dx_db": [pretty_complex(v, precision=6) for v in dx_db[fila]],
+                "dx_dA": [[pretty_complex(v, precision=6) for v in row] for row in dx_dA[fila]],
+                "top": rankings[fila],
+            })
+        return jsonify({"salidas": resultado})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+def _parse_elementos(elementos, n):
+    tipos, valores, pares = [], [], []
+    for e, el in enumerate(elementos or []):
+        try:
+            tipo, valor = parse_component(el["tipo"], el["valor"], el.get("prefijo", ''))
+            if valor <= 0: raise ValueError("el valor debe ser positivo")
+            p, q = int(el["entre"][0]), int(el["entre"][1])
+            if not (0 <= p <= n and 0 <= q <= n) or p == q: raise ValueError("terminales inválidos")
+        except Exception as ex:
+            raise ValueError(f"Error en elemento {e+1}: {ex}")
+        tipos.append(tipo); valores.append(valor); pares.append((p, q))
+    if not tipos:
+        raise ValueError("No hay elementos")
+    return tipos, valores, pares
+
+@app.route('/armonicos', methods=['POST'])
+@con_admision(_harmonics_request_cost)
+def armonicos_route():
+    try:
+        data = request.get_json()
+        mode = data.get('mode', 'mallas')
+        f0 = float(data.get('f0', 60))
+        espectro = data.get('espectro') or []
+        if not espectro:
+            raise ValueError("Espectro vacío")
+        n = len(espectro[0].get('vector') or [])
+        if n < 1 or n > MAX_SIZE_NUMERICO:
+            raise ValueError("Tamaño n inválido")
+        if len(espectro) > MAX_ARMONICOS:
+            raise ValueError(f"Demasiados armónicos (máx. {MAX_ARMONICOS})")
+        # Las matrices de todos los armónicos se arman apiladas: (H, n, n) complejos
+        if len(espectro) * n * n * 16 > ARMONICOS_MEMORIA_MAX:
+            raise ValueError(f"Armónicos x n² excede el límite ({ARMONICOS_MEMORIA_MAX // (1024*1024)} MB); reduzca H o n")
+        armonicos, B = [], np.zeros((len(espectro), n), dtype=complex)
+        for k, fila in enumerate(espectro):
+            h = float(fila['h'])
+            if h <= 0: raise ValueError("Los armónicos deben ser positivos")
+            if len(fila['vector']) != n: raise ValueError("Todos los vectores deben tener tamaño n")
+            armonicos.append(h)
+            for i, v in enumerate(fila['vector']):
+                try: B[k, i] = parse_complex(v)
+                except Exception as e: raise ValueError(f"Error en armónico {h:g}, b[{i+1}]: {e}")
+        tipos, valores, pares = _parse_elementos(data.get('elementos'), n)
+        X, rms, thd = solve_armonicos(tipos, valores, pares, armonicos, B, f0=f0, mode=mode)
+        pref = "I" if mode == 'mallas' else "V"
+        resultado = []
+        for i in range(n):
+            resultado.append({
+                "nombre": f"{pref}{i+1}",
+                "rms": float(rms[i]),
+                "thd": None if thd is None or np.isnan(thd[i]) else float(thd[i]),
+                "armonicos": [dict(pretty_complex(X[k, i], precision=4), h=armonicos[k]) for k in range(len(armonicos))],
+            })
+        return jsonify({"f0": f0, "resultado": resultado})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/thevenin', methods=['POST'])
+@con_admision(_thevenin_request_cost)
+def thevenin_route():
+    try:
+        data = request.get_json()
+        mode = data.get('mode', 'nodos')
+        A, b = validate_and_build_A_b(data.get('matrix'), data.get('vector'))
+        n = A.shape[0]
+        puertos = data.get('puertos') or []
+        if not puertos:
+            return jsonify({"error": "No hay puertos"}), 400
+        try:
+            puertos = [(int(p), int(q)) for p, q in puertos]
+        except Exception:
+            return jsonify({"error": "Cada puerto debe ser un par [p, q]"}), 400
+        if any(not (0 <= p <= n and 0 <= q <= n) or p == q for p, q in puertos):
+            return jsonify({"error": "Índice de puerto fuera de rango"}), 400
+        x, v_th, z_th, i_n = equivalentes_thevenin(A, b, puertos, mode=mode)
+
+        def valor(z):
+            return pretty_complex(z, precision=4) if np.isfinite(z) else None
+        resultado = []
+        for k, (p, q) in enumerate(puertos):
+            resultado.append({
+                "puerto": [p, q],
+                "v_th": valor(v_th[k]),
+                "z_th": valor(z_th[k]),
+                "i_n": valor(i_n[k]),
+                "y_n": valor(1 / z_th[k]) if z_th[k] != 0 else None,
+            })
+        return jsonify({"puertos": resultado})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# Transitorio: {"mode", "metodo": "trapecio" | "euler", "h", "pasos" | "t_final", "cada",
+#   "elementos": [...] (como en /armonicos), "interruptores": [{"entre", "r_on", "r_off",
+#   "inicial": "abierto" | "cerrado", "cambios": [t, ...]}], "fuentes": [{"en", "forma":
+#   "dc" | "escalon" | "seno" | "pulso", "amplitud", "retardo", "frecuencia", "fase" (grados),
+#   "ancho", "periodo"}]}
+# Responde un CSV (t y corrientes de malla o tensiones de nodo, un renglón cada "cada"
+# pasos) que se va generando mientras se envía. Los reactivos parten descargados.
+TRANSITORIO_FLUJOS = {"activos": 0}
+TRANSITORIO_LOCK = threading.Lock()
+
+def _parse_interruptores(interruptores, n):
+    salida = []
+    for k, s in enumerate(interruptores or []):
+        try:
+            p, q = int(s["entre"][0]), int(s["entre"][1])
+            if not (0 <= p <= n and 0 <= q <= n) or p == q: raise ValueError("terminales inválidos")
+            r_on, r_off = float(s.get("r_on", 1e-3)), float(s.get("r_off", 1e9))
+            if not 0 < r_on < r_off: raise ValueError("se requiere 0 < r_on < r_off")
+            inicial = str(s.get("inicial", "abierto")).lower()
+            if inicial not in ('abierto', 'cerrado'): raise ValueError("'inicial' debe ser abierto o cerrado")
+            cambios = [float(t) for t in s.get("cambios") or []]
+            if any(not math.isfinite(t) or t < 0 for t in cambios): raise ValueError("tiempos de cambio inválidos")
+        except Exception as ex:
+            raise ValueError(f"Error en interruptor {k+1}: {ex}")
+        salida.append(((p, q), r_on, r_off, inicial == 'cerrado', cambios))
+    return salida
+
+def _parse_fuentes(fuentes, n):
+    salida = []
+    for k, f in enumerate(fuentes or []):
+        try:
+            forma = str(f.get("forma", "dc")).lower()
+            if forma not in FORMAS_FUENTE: raise ValueError(f"forma '{forma}' desconocida (use {', '.join(FORMAS_FUENTE)})")
+            en = int(f["en"])
+            if not 1 <= en <= n: raise ValueError("índice fuera de rango")
+            fuente = {"en": en, "forma": forma}
+            for campo, defecto in (("amplitud", 1.0), ("retardo", 0.0), ("frecuencia", 60.0),
+                                   ("fase", 0.0), ("ancho", 0.0), ("periodo", 0.0)):
+                fuente[campo] = float(f.get(campo, defecto))
+                if not math.isfinite(fuente[campo]): raise ValueError(f"'{campo}' inválido")
+            if forma == 'pulso' and not 0 < fuente["ancho"] <= fuente["periodo"]:
+                raise ValueError("un pulso requiere 0 < ancho <= periodo")
+        except Exception as ex:
+            raise ValueError(f"Error en fuente {k+1}: {ex}")
+        salida.append(fuente)
+    if not salida:
+        raise ValueError("No hay fuentes")
+    return salida
+
+@app.route('/transitorio', methods=['POST'])
+def transitorio_route():
+    try:
+        data = request.get_json()
+        mode = data.get('mode', 'mallas')
+        h = float(data.get('h', 0))
+        if not (math.isfinite(h) and h > 0):
+            raise ValueError("El paso h debe ser positivo")
+        pasos = int(data['pasos']) if 'pasos' in data else int(round(float(data.get('t_final', 0)) / h))
+        if not 1 <= pasos <= TRANSITORIO_MAX_PASOS:
+            raise ValueError(f"Número de pasos inválido (1..{TRANSITORIO_MAX_PASOS})")
+        cada = int(data.get('cada', 1))
+        if cada < 1:
+            raise ValueError("'cada' debe ser al menos 1")
+        plazo = Plazo()
+        with plazo.en('parseo'):
+            tipos, valores, pares = _parse_elementos(data.get('elementos'), MAX_SIZE_NUMERICO)
+            interruptores = _parse_interruptores(data.get('interruptores'), MAX_SIZE_NUMERICO)
+            if sum(len(s[4]) for s in interruptores) > TRANSITORIO_MAX_CAMBIOS:
+                raise ValueError(f"Demasiados cambios de interruptores (máx. {TRANSITORIO_MAX_CAMBIOS})")
+            n = max(max(par) for par in pares + [s[0] for s in interruptores])
+            fuentes = _parse_fuentes(data.get('fuentes'), n)
+    except PlazoVencido as e:
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    with TRANSITORIO_LOCK:
+        if TRANSITORIO_FLUJOS["activos"] >= TRANSITORIO_MAX_FLUJOS:
+            resp = jsonify({"error": "Demasiadas simulaciones en curso"})
+            resp.status_code = 503
+            resp.headers['Retry-After'] = '5'
+            return resp
+        TRANSITORIO_FLUJOS["activos"] += 1
+
+    # La admisión se reserva hasta que termina el envío: la simulación corre en el flujo
+    costo = admission_cost(transient_cost(n, len(tipos), pasos, sum(len(s[4]) for s in interruptores)))
+    t0 = time.perf_counter()
+    admitida = ADMISION.entrar(costo)
+
+    def liberar():
+        if admitida:
+            ADMISION.salir(costo, time.perf_counter() - t0)
+        with TRANSITORIO_LOCK:
+            TRANSITORIO_FLUJOS["activos"] -= 1
+
+    if not admitida:
+        liberar()
+        return busy_response(ServidorOcupado())
+    try:
+        with plazo.en('solucion'):
+            sim = SimuladorTransitorio(tipos, valores, pares, n, h, data.get('metodo', 'trapecio'),
+                                       mode, interruptores)
+            sim.prepare(pasos) # Factoriza todos los estados antes de empezar a enviar
+    except PlazoVencido as e:
+        liberar()
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except Exception as e:
+        liberar()
+        return jsonify({"error": str(e)}), 400
+
+    pref = "I" if mode == 'mallas' else "V"
+    fila = ",".join(["%.9g"] * (n + 1)) + "\n"
+    def csv():
+        yield "t," + ",".join(f"{pref}{i+1}" for i in range(n)) + "\n"
+        for t, X in sim.simulate(fuentes, pasos, cada):
+            # Un solo formateo por bloque (más rápido que np.savetxt, que va fila por fila)
+            yield (fila * len(t)) % tuple(np.column_stack([t, X]).ravel().tolist())
+
+    resp = app.response_class(csv(), mimetype='text/csv')
+    resp.call_on_close(liberar) # También si el cliente corta antes del final
+    resp.headers['Content-Disposition'] = 'attachment; filename=transitorio.csv'
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+# Reducción de Kron: {"matrix", "vector", "terminales": [...] | "internos": [...]}
+# (índices desde 1). Responde Y_red e I_eq como texto (se pueden cargar en el editor) y
+# el id de la reducción, que es el hash del caso: pedir de nuevo la misma reducción no
+# vuelve a factorizar. /kron/<id>/solve recibe {"vector": [...]} o {"vectores": [[...]]}
+# con las inyecciones en los terminales (en su orden; sin vector se usan las originales)
+# y, con "internos": true, devuelve también las tensiones de los nodos eliminados.
+# Con las respuestas numéricas de 10.6 sale una fila por vector: primero los
+# terminales y luego los internos, en el orden que devolvió /kron.
+REDUCCIONES = OrderedDict()
+REDUCCIONES_LOCK = threading.Lock()
+
+def _parse_indices(valores, n, nombre):
+    try:
+        indices = sorted({int(v) for v in valores})
+    except Exception:
+        raise ValueError(f"'{nombre}' debe ser una lista de índices")
+    if any(not 1 <= k <= n for k in indices):
+        raise ValueError(f"Índice fuera de rango en '{nombre}' (1..{n})")
+    return np.array(indices, dtype=int) - 1
+
+def get_reduccion(clave):
+    with REDUCCIONES_LOCK:
+        red = REDUCCIONES.get(clave)
+        if red is not None:
+            REDUCCIONES.move_to_end(clave)
+        return red
+
+@app.route('/kron', methods=['POST'])
+@con_admision(_solve_request_cost)
+def kron_route():
+    try:
+        data = request.get_json()
+        plazo = Plazo()
+        with plazo.en('parseo'):
+            A, b = validate_and_build_A_b(data.get('matrix'), data.get('vector'))
+        n = A.shape[0]
+        if data.get('terminales') is not None:
+            terminales = _parse_indices(data['terminales'], n, 'terminales')
+        elif data.get('internos') is not None:
+            terminales = np.setdiff1d(np.arange(n), _parse_indices(data['internos'], n, 'internos'))
+        else:
+            raise ValueError("Indique 'terminales' o 'internos'")
+        if not len(terminales):
+            raise ValueError("Debe quedar al menos un terminal")
+        clave = artifact_key('kron', A, b, terminales.tolist())
+        red = get_reduccion(clave)
+        if red is None:
+            with plazo.en('solucion'):
+                red = run_with_deadline(ReduccionKron, A, b, terminales) if n >= PLAZO_POOL_MIN_N \
+                    else ReduccionKron(A, b, terminales)
+            with REDUCCIONES_LOCK:
+                REDUCCIONES[clave] = red
+                while len(REDUCCIONES) > MAX_REDUCCIONES:
+                    REDUCCIONES.popitem(last=False)
+        return jsonify({"id": clave, "solve_url": f"/kron/{clave}/solve",
+                        "terminales": (red.terminales + 1).tolist(), "internos": (red.internos + 1).tolist(),
+                        "matrix": [[format_cell(z) for z in fila] for fila in red.Y_red],
+                        "vector": [format_cell(z) for z in red.I_eq]})
+    except PlazoVencido as e:
+        return jsonify({"error": str(e), "etapa": e.etapa}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/kron/<clave>/solve', methods=['POST'])
+def kron_solve_route(clave):
+    red = get_reduccion(clave)
+    if red is None:
+        return jsonify({"error": "Reducción no disponible; envíe de nuevo la matriz a /kron"}), 404
+    try:
+        tipo = response_type()
+        forma = response_shape()
+        data = request.get_json(silent=True) or {}
+        vectores = data.get('vectores') or ([data['vector']] if data.get('vector') is not None else None)
+        t = len(red.terminales)
+        if vectores is None:
+            V_t, V_i = (v[:, None] for v in red.solve())
+        else:
+            if len(vectores) > MAX_VECTORES_KRON:
+                raise ValueError(f"Demasiados vectores (máx. {MAX_VECTORES_KRON})")
+            I = np.zeros((t, len(vectores)), dtype=complex)
+            for k, v in enumerate(vectores):
+                if not isinstance(v, list) or len(v) != t:
+                    raise ValueError(f"Cada vector debe tener {t} inyecciones (una por terminal)")
+                for j, valor in enumerate(v):
+                    try: I[j, k] = parse_complex(valor)
+                    except Exception as e: raise ValueError(f"Error en vector {k+1}, terminal {red.terminales[j]+1}: {e}")
+            V_t, V_i = red.solve(I)
+        if tipo != 'application/json':
+            # Una fila por vector: terminales y, con "internos", los nodos eliminados a continuación
+            X = np.vstack([V_t, V_i]) if data.get('internos') else V_t
+            nodos = np.concatenate([red.terminales, red.internos]) if data.get('internos') else red.terminales
+            return numeric_response(X.T, tipo, forma, extra={"nodos": (nodos + 1).tolist()})
+        resultados = []
+        for k in range(V_t.shape[1]):
+            fila = {"terminales": [dict(pretty_complex(V_t[j, k], precision=4), nodo=int(nodo) + 1)
+                                   for j, nodo in enumerate(red.terminales)]}
+            if data.get('internos'):
+                fila["internos"] = [dict(pretty_complex(V_i[j, k], precision=4), nodo=int(nodo) + 1)
+                                    for j, nodo in enumerate(red.internos)]
+            resultados.append(fila)
+        return jsonify({"resultados": resultados})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 # 12. Punto de Entrada Principal
+def preload_resources():
+    # Proceso maestro: lo que se comparte copy-on-write entre workers
+    from matplotlib import font_manager
+    font_manager.findfont(font_manager.FontProperties(family=matplotlib.rcParams['font.family'])) # Carga/crea la caché de fuentes
+
+def warm_up():
+    # Cada worker, antes de aceptar tráfico: BLAS/LAPACK, dibujo y PDF en frío
+    t0 = time.perf_counter()
+    A, b, _ = gen_rlc_series(3)
+    x = solve_system(A, b, method='gauss')
+    Factorizacion(A).solve(b)
+    make_fasor_png(x, mode='mallas')
+    create_pdf_bytes([[format_cell(z) for z in row] for row in A], [format_cell(z) for z in b],
+                     x, A, b, 'mallas')
+    return time.perf_counter() - t0
+
+def run_production(bind, workers, threads):
+    global VIVO_MAX_STREAMS
+    from gunicorn.app.base import BaseApplication
+    # Los flujos en vivo retienen hilos: siempre queda al menos uno para las peticiones normales
+    VIVO_MAX_STREAMS = min(VIVO_MAX_STREAMS, max(threads - 1, 0))
+
+    def post_worker_init(worker):
+        worker.log.info("Worker %s calentado en %.0f ms", worker.pid, warm_up() * 1000)
+
+    class CircuitSolveServer(BaseApplication):
+        def load_config(self):
+            opciones = {
+                "bind": bind,
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                # La app ya está importada aquí: se carga antes del fork y se comparte
+                "preload_app": True,
+                "post_worker_init": post_worker_init,
+            }
+            for clave, valor in opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return app
+
+    preload_resources()
+    CircuitSolveServer().run()
+
 if __name__ == "__main__":
-    print("================================================================")
-    print("Iniciando CircuitSolve (Fase 3.7 - Final)")
-    print(f"Servidor corriendo en http://127.0.0.1:5000 y en tu IP local.")
-    print("Presiona CTRL+C para detener.")
-    print("================================================================")
-    app.run(debug=True, port=5000, use_reloader=True, host='0.0.0.0')
+    import argparse
+    parser = argparse.ArgumentParser(description="CircuitSolve - Análisis de Circuitos AC")
+    parser.add_argument('--produccion', action='store_true', help="Servir con gunicorn (preload + calentamiento)")
+    parser.add_argument('--bind', default=os.environ.get('CIRCUITSOLVE_BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('CIRCUITSOLVE_WORKERS', os.cpu_count() or 2)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('CIRCUITSOLVE_THREADS', 4)))
+    args = parser.parse_args()
+    if args.produccion:
+        run_production(args.bind, args.workers, args.threads)
+    else:
+        print("================================================================")
+        print("Iniciando CircuitSolve (Fase 3.7 - Final)")
+        print(f"Servidor corriendo en http://127.0.0.1:5000 y en tu IP local.")
+        print("Presiona CTRL+C para detener.")
+        print("================================================================")
+        app.run(debug=True, port=5000, use_reloader=True, host='0.0.0.0')
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Sin almacén persistente: cada prueba parte de cachés vacías
+os.environ.setdefault('CIRCUITSOLVE_ALMACEN', '')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import proyecto_final
+
+
+@pytest.fixture
+def client():
+    return proyecto_final.app.test_client()
@@ -0,0 +1,37 @@
+import proyecto_final
+
+
+def _pdf_url(client):
+    resp = client.post('/solve', json={"matrix": [["10", "-2"], ["-2", "8"]], "vector": ["5", "0"]})
+    assert resp.status_code == 200
+    return resp.get_json()["pdf_url"]
+
+
+def _espillar_todo(monkeypatch):
+    # Presupuesto cero: cada artefacto va al archivo mmap en cuanto se guarda
+    monkeypatch.setattr(proyecto_final.ARTEFACTOS, 'presupuesto', 0)
+    monkeypatch.setattr(proyecto_final, 'ESPILL_MIN', 0)
+
+
+def test_range_en_artefacto_volcado(client, monkeypatch):
+    _espillar_todo(monkeypatch)
+    url = _pdf_url(client)
+    completo = client.get(url)
+    assert completo.status_code == 200
+    clave = url[len('/reporte/'):-len('.pdf')]
+    assert proyecto_final.ARTEFACTOS.entradas[clave]["archivo"] is not None
+
+    parcial = client.get(url, headers={'Range': 'bytes=10-99'})
+    assert parcial.status_code == 206
+    assert parcial.headers['Content-Range'] == f"bytes 10-99/{len(completo.data)}"
+    assert parcial.data == completo.data[10:100]
+
+    fuera = client.get(url, headers={'Range': f"bytes={len(completo.data) + 10}-"})
+    assert fuera.status_code == 416
+
+
+def test_etag_en_artefacto_volcado(client, monkeypatch):
+    _espillar_todo(monkeypatch)
+    url = _pdf_url(client)
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,37 @@
+import numpy as np
+
+import proyecto_final
+
+CIRCUITO_RC = {
+    "h": 1e-4,
+    "mode": "nodos",
+    "elementos": [{"tipo": "R", "valor": "10", "entre": [1, 0]},
+                  {"tipo": "C", "valor": "1", "prefijo": "m", "entre": [1, 0]}],
+    "fuentes": [{"en": 1, "forma": "seno", "amplitud": 1.0, "frecuencia": 50.0}],
+}
+
+
+def _csv(client, **extra):
+    resp = client.post('/transitorio', json=dict(CIRCUITO_RC, **extra))
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    filas = resp.get_data(as_text=True).splitlines()[1:]
+    resp.close()
+    return np.array([[float(v) for v in fila.split(',')] for fila in filas])
+
+
+def test_cada_mayor_que_el_bloque_no_agranda_el_bloque(client, monkeypatch):
+    monkeypatch.setattr(proyecto_final, 'TRANSITORIO_BLOQUE', 64)
+    tamanos = []
+    original = proyecto_final.source_matrix
+
+    def espia(fuentes, t, n):
+        tamanos.append(len(t))
+        return original(fuentes, t, n)
+
+    monkeypatch.setattr(proyecto_final, 'source_matrix', espia)
+    completo = _csv(client, pasos=5000, cada=1)
+    tamanos.clear()
+    # Los pasos se numeran desde 1: se guardan los múltiplos de `cada`
+    ralo = _csv(client, pasos=5000, cada=1000)
+    assert max(tamanos) <= 64
+    np.testing.assert_allclose(ralo, completo[999::1000], rtol=1e-7)